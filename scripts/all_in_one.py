@@ -13,6 +13,11 @@ import subprocess
 from pathlib import Path
 from datetime import datetime
 
+import model_pool
+import ffmpeg_runner
+import transcript_store
+from cache_store import TranscriptCache
+
 # 设置控制台编码为UTF-8
 if sys.platform == 'win32':
     import io
@@ -23,10 +28,56 @@ if sys.platform == 'win32':
 class VideoCutterPipeline:
     """视频剪辑流水线"""
 
-    def __init__(self, config_path: str = None):
+    def __init__(self, config_path: str = None, pool: model_pool.ModelPool = None):
         self.config_path = config_path or "config.yaml"
+        self.config = self._load_config(self.config_path)
+        self.pool = pool or model_pool.default_pool
+        self.transcript_cache = TranscriptCache(self.config)
+        ffmpeg_runner.configure(self.config)
+        self._transcribed_by = None
+        self.keeps = None
+        self.gif_cache_stats = None
         self.steps_completed = []
 
+    def _load_config(self, config_path: str) -> dict:
+        """加载配置文件，失败时返回空配置"""
+        try:
+            import yaml
+            if os.path.exists(config_path):
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    config = yaml.safe_load(f)
+                    if isinstance(config, dict):
+                        return config
+        except Exception as e:
+            print(f"⚠️ 配置文件加载失败，使用默认配置: {e}")
+        return {}
+
+    def warm_up_models(self):
+        """预热流水线用到的模型，之后的多次运行共享同一实例"""
+        from transcriber import model_spec
+
+        transcribe_config = self.config.get('transcription', {})
+        specs = []
+        # 分片转录时每个分片进程各自加载模型，主进程预热的实例用不上
+        if transcribe_config.get('shards', 1) <= 1:
+            specs.append(model_spec(
+                transcribe_config.get('funasr_backend', 'torch'),
+                transcribe_config.get('compute_type') == 'int8',
+                presegmented=transcribe_config.get('segmentation', 'vad') == 'vad'
+            ))
+        if self.config.get('subtitle', {}).get('source', 'transcript') == 'whisper':
+            specs.append(('whisper', {'model_size': 'medium'}))
+        for kind, params in specs:
+            try:
+                self.pool.warm_up(kind, **params)
+            except Exception as e:
+                print(f"⚠️ 模型预热失败 ({kind}): {e}")
+
+    def evict_models(self):
+        """驱逐模型池中的空闲模型"""
+        evicted = self.pool.evict()
+        print(f"🧹 已释放 {evicted} 个模型")
+
     def print_banner(self):
         """打印欢迎横幅"""
         print("\n" + "=" * 60)
@@ -59,6 +110,13 @@ class VideoCutterPipeline:
             num_gifs: 生成 GIF 数量
             preview_only: 仅预览不执行剪辑
         """
+        # 本条流水线的 ffmpeg 运行单独汇总（批量处理时多条流水线并发运行）
+        with ffmpeg_runner.collect():
+            return self._run(video_path, project_name, remove_silence, generate_gifs, num_gifs, preview_only)
+
+    def _run(self, video_path: str, project_name: str, remove_silence: bool, generate_gifs: bool,
+             num_gifs: int, preview_only: bool):
+        """完整流程（在本流水线的 ffmpeg 汇总上下文中运行）"""
         self.print_banner()
 
         # 验证输入
@@ -91,9 +149,11 @@ class VideoCutterPipeline:
 
         # 定义文件路径
         transcript_json = os.path.join(temp_dir, "transcript.json")
+        transcript_bin = os.path.join(temp_dir, "transcript.vct")
         filter_txt = os.path.join(temp_dir, "filter.txt")
         quotes_json = os.path.join(temp_dir, "golden_quotes.json")
         stats_json = os.path.join(temp_dir, "stats.json")
+        runs_json = os.path.join(temp_dir, "ffmpeg_runs.json")
         output_video = os.path.join(output_dir, f"剪辑后_{video_name}.mp4")
         gifs_dir = os.path.join(output_dir, "gifs")
 
@@ -107,9 +167,20 @@ class VideoCutterPipeline:
             return
         self.steps_completed.append("transcribe")
 
+        # 转为列式二进制格式，后续各阶段共享读取；
+        # 已有且不旧于 JSON 时沿用，保留其中持久化的句子表
+        try:
+            if (not os.path.exists(transcript_bin)
+                    or os.path.getmtime(transcript_bin) < os.path.getmtime(transcript_json)):
+                transcript_store.convert(transcript_json, transcript_bin)
+            transcript_file = transcript_bin
+        except Exception as e:
+            print(f"⚠️ 转录格式转换失败，继续使用 JSON: {e}")
+            transcript_file = transcript_json
+
         # ===== 步骤 2: 分析 =====
         self.print_step(2, total_steps, "分析并生成剪辑方案")
-        if not self._analyze(transcript_json, filter_txt, remove_silence, preview_only):
+        if not self._analyze(transcript_file, filter_txt, remove_silence, preview_only):
             return
         self.steps_completed.append("analyze")
 
@@ -117,21 +188,38 @@ class VideoCutterPipeline:
             print("\n⚠️ 预览模式，跳过实际剪辑")
             return
 
+        subtitle_config = self.config.get('subtitle', {})
+        subtitle_format = subtitle_config.get('format', 'srt')
+        srt_path = os.path.join(output_dir, f"{video_basename}.{subtitle_format}")
+
+        # 烧录字幕时与剪辑合并为一次编码（需要字幕已对齐剪辑后的时间轴）
+        embed_subtitle = self.config.get('output', {}).get('embed_subtitle', False)
+        if embed_subtitle and (subtitle_config.get('source', 'transcript') == 'whisper'
+                               or not subtitle_config.get('remap_to_cut', True)):
+            print("⚠️ 烧录字幕需要由转录生成并对齐剪辑时间轴，本次不烧录")
+            embed_subtitle = False
+
         # ===== 步骤 3: 剪辑 =====
         self.print_step(3, total_steps, "执行剪辑 (FFmpeg)")
-        if not self._clip(video_path, filter_txt, output_video):
+        burn_path = None
+        if embed_subtitle and self._generate_subtitle(video_path, transcript_file, srt_path):
+            burn_path = srt_path
+            self.steps_completed.append("subtitle")
+        if not self._clip(video_path, filter_txt, output_video, burn_path):
             return
         self.steps_completed.append("clip")
 
         # ===== 步骤 4: 生成字幕 =====
         self.print_step(4, total_steps, "生成字幕文件")
-        srt_path = os.path.join(output_dir, f"{video_basename}.srt")
-        self._generate_subtitle(video_path, srt_path)
-        self.steps_completed.append("subtitle")
+        if burn_path:
+            print(f"✅ 字幕已随剪辑烧录: {srt_path}")
+        else:
+            self._generate_subtitle(video_path, transcript_file, srt_path)
+            self.steps_completed.append("subtitle")
 
         # ===== 步骤 5: 金句检测 =====
         self.print_step(5, total_steps, "检测金句")
-        self._detect_quotes(transcript_json, quotes_json)
+        self._detect_quotes(transcript_file, quotes_json)
         self.steps_completed.append("quotes")
 
         # ===== 步骤 6: 生成 GIF =====
@@ -145,19 +233,64 @@ class VideoCutterPipeline:
         self._generate_stats(
             video_path,
             output_video,
-            transcript_json,
+            transcript_file,
             quotes_json,
             stats_json
         )
+        # 各次 ffmpeg 运行的吞吐量汇总，与 stats.json 放在一起
+        ffmpeg_runner.save_summaries(runs_json)
 
         # ===== 完成 =====
-        self.print_completion(output_video, stats_json, gifs_dir if generate_gifs else None)
+        self.print_completion(output_video, stats_json, gifs_dir if generate_gifs else None, runs_json)
+
+    def _transcript_variants(self) -> list:
+        """转录缓存键的候选 (后端, 模型, 参数)，顺序与实际调用顺序一致"""
+        transcribe_config = self.config.get('transcription', {})
+        # 分片会在边界处做去重拼接，输出与不分片不同；重叠只在分片时才影响结果
+        shards = max(1, transcribe_config.get('shards', 1))
+        return [
+            ('whisperX', transcribe_config.get('model', 'medium'), {
+                'compute_type': transcribe_config.get('compute_type', 'float16'),
+                'diarization': transcribe_config.get('diarization', False)
+            }),
+            ('funasr', 'paraformer-zh+fsmn-vad+ct-punc', {
+                'segmentation': transcribe_config.get('segmentation', 'vad'),
+                'max_chunk': transcribe_config.get('max_chunk', 30),
+                'backend': transcribe_config.get('funasr_backend', 'torch'),
+                'int8': transcribe_config.get('compute_type') == 'int8',
+                'shards': shards,
+                'shard_overlap': transcribe_config.get('shard_overlap', 3.0) if shards > 1 else None
+            }),
+        ]
 
     def _transcribe(self, video_path: str, output_json: str, temp_dir: str) -> bool:
+        """转录视频（优先读取转录缓存）"""
+        variants = self._transcript_variants()
+        try:
+            backend = self.transcript_cache.lookup(video_path, output_json, variants)
+            if backend:
+                print(f"⚡ 命中转录缓存 ({backend})，跳过转录")
+                return True
+        except Exception as e:
+            print(f"⚠️ 转录缓存读取失败: {e}")
+
+        if self._transcribe_uncached(video_path, output_json, temp_dir):
+            backend = self._transcribed_by
+            for variant in variants:
+                if variant[0] == backend:
+                    try:
+                        self.transcript_cache.save(video_path, output_json, *variant)
+                    except Exception as e:
+                        print(f"⚠️ 转录缓存写入失败: {e}")
+            return True
+        return False
+
+    def _transcribe_uncached(self, video_path: str, output_json: str, temp_dir: str) -> bool:
         """转录视频"""
         try:
             # 优先使用 WhisperX（如果可用）
             if self._try_whisperX(video_path, output_json, temp_dir):
+                self._transcribed_by = 'whisperX'
                 return True
 
             # 回退到原始转录方法
@@ -167,7 +300,20 @@ class VideoCutterPipeline:
             transcriber = importlib.util.module_from_spec(spec)
             spec.loader.exec_module(transcriber)
 
-            return transcriber.transcribe_video(video_path, output_json, temp_dir)
+            transcribe_config = self.config.get('transcription', {})
+            self._transcribed_by = 'funasr'
+            return transcriber.transcribe_video(
+                video_path, output_json, temp_dir,
+                pool=self.pool,
+                batch_size=transcribe_config.get('batch_size', 1),
+                segmentation=transcribe_config.get('segmentation', 'vad'),
+                max_chunk_sec=transcribe_config.get('max_chunk', 30),
+                queue_depth=transcribe_config.get('queue_depth', 4),
+                shards=transcribe_config.get('shards', 1),
+                overlap_sec=transcribe_config.get('shard_overlap', 3.0),
+                backend=transcribe_config.get('funasr_backend', 'torch'),
+                quantize=transcribe_config.get('compute_type') == 'int8'
+            )
 
         except Exception as e:
             print(f"❌ 转录失败: {e}")
@@ -216,12 +362,13 @@ class VideoCutterPipeline:
                 analyzer = importlib.util.module_from_spec(spec)
                 spec.loader.exec_module(analyzer)
 
-                return analyzer.analyze_transcript(
+                self.keeps = analyzer.analyze_transcript(
                     transcript_json,
                     filter_txt,
                     config_file=self.config_path,
                     use_llm=False  # 默认不使用LLM
                 )
+                return bool(self.keeps)
             else:
                 # 使用原版分析器
                 import importlib.util
@@ -229,29 +376,48 @@ class VideoCutterPipeline:
                 analyzer = importlib.util.module_from_spec(spec)
                 spec.loader.exec_module(analyzer)
 
-                return analyzer.analyze_transcript(transcript_json, filter_txt, remove_silence)
+                self.keeps = analyzer.analyze_transcript(transcript_json, filter_txt, remove_silence)
+                return bool(self.keeps)
 
         except Exception as e:
             print(f"❌ 分析失败: {e}")
             return False
 
-    def _clip(self, video_path: str, filter_txt: str, output_video: str) -> bool:
-        """剪辑视频"""
+    def _clip(self, video_path: str, filter_txt: str, output_video: str,
+              subtitle_path: str = None) -> bool:
+        """剪辑视频（可在同一次编码中烧录字幕，或一次输出多个版本）"""
         try:
             import importlib.util
             spec = importlib.util.spec_from_file_location("clipper", "clipper.py")
             clipper = importlib.util.module_from_spec(spec)
             spec.loader.exec_module(clipper)
 
-            clipper.clip_video(video_path, filter_txt, output_video)
-            return True
+            # 配置了清晰度时，一次解码同时输出全部版本与音频
+            renditions, audio_path = clipper.plan_renditions(output_video, self.config.get('output', {}))
+            derived = clipper.derivable_renditions(renditions, output_video)
+            if derived is None:
+                return clipper.render_renditions(video_path, filter_txt, renditions, audio_path, subtitle_path)
+
+            # 只有一个清晰度：主输出按所选引擎剪辑，其余格式与音频由成片转码
+            clip_config = self.config.get('clip', {})
+            ok = clipper.clip_video(
+                video_path, filter_txt, output_video, subtitle_path,
+                engine=clip_config.get('engine', 'auto'),
+                concat_threshold=clip_config.get('concat_threshold', clipper.CONCAT_THRESHOLD),
+                group_size=clip_config.get('group_size', clipper.GROUP_SIZE),
+                smart_render=clip_config.get('smart_render', False),
+                smart_crf=clip_config.get('smart_crf', clipper.SMART_CRF),
+                workers=clip_config.get('workers', 1),
+                threads=clip_config.get('threads_per_worker', 0)
+            )
+            return ok and clipper.derive_renditions(output_video, derived, audio_path)
 
         except Exception as e:
             print(f"❌ 剪辑失败: {e}")
             return False
 
-    def _generate_subtitle(self, video_path: str, srt_path: str) -> bool:
-        """生成字幕"""
+    def _generate_subtitle(self, video_path: str, transcript_file: str, srt_path: str) -> bool:
+        """生成字幕（默认直接由转录生成，并对齐剪辑后的时间轴）"""
         try:
             if os.path.exists("subtitler.py"):
                 import importlib.util
@@ -259,7 +425,18 @@ class VideoCutterPipeline:
                 subtitler = importlib.util.module_from_spec(spec)
                 spec.loader.exec_module(subtitler)
 
-                return subtitler.generate_srt(video_path, srt_path)
+                subtitle_config = self.config.get('subtitle', {})
+                if subtitle_config.get('source', 'transcript') == 'whisper':
+                    return subtitler.generate_srt(video_path, srt_path, pool=self.pool,
+                                                  subtitle_format=subtitle_config.get('format', 'srt'))
+
+                return subtitler.generate_from_transcript(
+                    transcript_file,
+                    srt_path,
+                    keeps=self.keeps if subtitle_config.get('remap_to_cut', True) else None,
+                    max_chars=subtitle_config.get('max_chars', 16),
+                    max_duration=subtitle_config.get('max_duration', 5.0)
+                )
 
         except Exception as e:
             print(f"⚠️ 字幕生成失败: {e}")
@@ -293,6 +470,7 @@ class VideoCutterPipeline:
 
                 gg = gif_gen.GifGenerator(self.config_path)
                 gg.generate_from_quotes(video_path, quotes_json, gifs_dir, num_gifs)
+                self.gif_cache_stats = gg.cache.stats()
 
         except Exception as e:
             print(f"⚠️ GIF 生成失败: {e}")
@@ -319,7 +497,8 @@ class VideoCutterPipeline:
         except Exception as e:
             print(f"⚠️ 统计分析失败: {e}")
 
-    def print_completion(self, output_video: str, stats_json: str, gifs_dir: str = None):
+    def print_completion(self, output_video: str, stats_json: str, gifs_dir: str = None,
+                         runs_json: str = None):
         """打印完成信息"""
         print("\n" + "=" * 60)
         print("✅ 处理完成！")
@@ -332,14 +511,35 @@ class VideoCutterPipeline:
             print(f"   文件大小: {size_mb:.1f} MB")
 
         if gifs_dir and os.path.exists(gifs_dir):
-            gifs = [f for f in os.listdir(gifs_dir) if f.endswith('.gif')]
+            # 体积预算模式下动图可能输出为 WebP / MP4
+            gifs = [f for f in os.listdir(gifs_dir) if f.lower().endswith(('.gif', '.webp', '.mp4'))]
             if gifs:
-                print(f"\n🎨 生成 GIF: {len(gifs)} 个")
+                by_format = {}
+                for f in gifs:
+                    ext = os.path.splitext(f)[1].lstrip('.').lower()
+                    by_format[ext] = by_format.get(ext, 0) + 1
+                detail = '，'.join(f"{ext.upper()} {n}" for ext, n in sorted(by_format.items()))
+                print(f"\n🎨 生成动图: {len(gifs)} 个（{detail}）")
                 print(f"   目录: {gifs_dir}")
 
         if os.path.exists(stats_json):
             print(f"\n📊 统计报告: {stats_json}")
 
+        if runs_json and os.path.exists(runs_json):
+            with open(runs_json, 'r', encoding='utf-8') as f:
+                runs = json.load(f)
+            if runs['runs']:
+                print(f"\n⏱️ FFmpeg: {len(runs['runs'])} 次运行，共 {runs['total_wall_sec']:.1f} 秒，"
+                      f"平均 {runs['overall_speed']:.2f}x 实时")
+                print(f"   明细: {runs_json}")
+
+        cache_stats = self.transcript_cache.stats()
+        if cache_stats['hits'] or cache_stats['misses']:
+            print(f"\n💾 转录缓存: 命中 {cache_stats['hits']} 次 / 未命中 {cache_stats['misses']} 次")
+        if self.gif_cache_stats and (self.gif_cache_stats['hits'] or self.gif_cache_stats['misses']):
+            print(f"💾 GIF 缓存: 命中 {self.gif_cache_stats['hits']} 次 / 未命中 {self.gif_cache_stats['misses']} 次"
+                  f"（命中率 {self.gif_cache_stats['hit_rate']:.0%}）")
+
         print("\n" + "=" * 60 + "\n")
 
 
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+向量化分析核心 - 用 NumPy 数组运算计算语气词 / 重复片段 / 静音删除区间
+并以排序 + 累积最大值的方式合并区间、计算保留段
+
+结果与原先 analyzer / analyzer_complete 中逐字循环得到的删除列表完全一致，
+可用 --benchmark 对比两者的耗时并校验一致性。
+"""
+
+import sys
+import time
+import argparse
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+# 设置控制台编码为UTF-8（仅在直接运行时）
+if sys.platform == 'win32' and __name__ == '__main__':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+
+# ===== 输入转换 =====
+
+def as_int_array(values: Sequence[int]) -> np.ndarray:
+    """starts/ends（array('i') / memoryview / list）→ int64 数组，避免加缓冲时溢出"""
+    try:
+        return np.frombuffer(values, dtype=np.int32).astype(np.int64)
+    except (TypeError, ValueError):
+        return np.asarray(values, dtype=np.int64)
+
+
+def token_codes(tokens: Sequence[str]) -> Tuple[np.ndarray, dict]:
+    """
+    把 token 序列编码为整数数组，便于做相等比较
+
+    逐字转录（tokens 为 str）直接取 Unicode 码位；否则按出现顺序建词表。
+
+    Returns:
+        (codes, vocab)；逐字转录时 vocab 为 None
+    """
+    if isinstance(tokens, str):
+        return np.frombuffer(tokens.encode('utf-32-le'), dtype=np.uint32).astype(np.int64), None
+    vocab = {}
+    codes = np.fromiter((vocab.setdefault(t, len(vocab)) for t in tokens), dtype=np.int64, count=len(tokens))
+    return codes, vocab
+
+
+def word_codes(words: Iterable[str], vocab) -> np.ndarray:
+    """词表中的词 → 编码；逐字转录只有单字词可能整 token 命中"""
+    if vocab is None:
+        return np.array([ord(w) for w in words if len(w) == 1], dtype=np.int64)
+    return np.array([vocab[w] for w in words if w in vocab], dtype=np.int64)
+
+
+# ===== 掩码 =====
+
+def filler_mask(codes: np.ndarray, filler_codes: np.ndarray) -> np.ndarray:
+    """token 恰好是某个语气词"""
+    return np.isin(codes, filler_codes)
+
+
+def repeat_mask(codes: np.ndarray) -> np.ndarray:
+    """第 i 个 token 与第 i+1 个相同（长度 n，最后一位恒为 False）"""
+    mask = np.zeros(len(codes), dtype=bool)
+    if len(codes) > 1:
+        mask[:-1] = codes[:-1] == codes[1:]
+    return mask
+
+
+# ===== 重复片段（口吃 / 重说） =====
+
+# 多项式滚动哈希的基数；uint64 运算自然按 2^64 取模，命中后再逐 token 校验
+HASH_BASE = np.uint64(1_000_003)
+REPEAT_KEEPS = ('last', 'first')
+
+
+def repeat_ranges(codes: np.ndarray, min_len: int = 1, max_len: int = 8,
+                  keep: str = 'last') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    紧邻重复片段（如「我们我们」「这个问题这个问题」）的删除区间
+
+    对每个长度 L（min_len..max_len），窗口哈希由 L-1 的哈希递推一步得到，
+    比较 [i, i+L) 与 [i+L, i+2L) 的哈希并逐 token 校验，总耗时 O(n * max_len)。
+    同一 L 的连续命中视为一次多遍重说（「我们我们我们」）。
+
+    Args:
+        codes: token_codes 得到的编码
+        keep: 'last' 删除前面几遍只留最后一遍（默认），'first' 只留第一遍
+
+    Returns:
+        (first, last) token 区间数组，已按位置合并为互不相交的区间
+    """
+    if keep not in REPEAT_KEEPS:
+        raise ValueError(f"keep 只能是 {REPEAT_KEEPS}，收到 {keep!r}")
+    n = len(codes)
+    min_len = max(1, min_len)
+    max_len = min(max_len, n // 2)
+    empty = np.empty(0, dtype=np.int64)
+    if max_len < min_len:
+        return empty, empty
+
+    values = codes.astype(np.uint64)
+    hashes = np.zeros(n, dtype=np.uint64)
+    firsts, lasts = [], []
+    for length in range(1, max_len + 1):
+        # 长度为 length 的窗口哈希：hashes[i] 覆盖 [i, i+length)，有效下标 0..n-length
+        hashes = hashes[:n - length + 1] * HASH_BASE + values[length - 1:]
+        if length < min_len:
+            continue
+
+        cand = np.flatnonzero(hashes[:n - 2 * length + 1] == hashes[length:])
+        for k in range(length):
+            if not len(cand):
+                break
+            cand = cand[codes[cand + k] == codes[cand + length + k]]
+        if not len(cand):
+            continue
+
+        # 连续命中 a..b 合为一次重说：保留最后一遍删 [a, b+L)，保留第一遍删 [a+L, b+2L)
+        run_heads = np.flatnonzero(np.diff(cand, prepend=-2) != 1)
+        a = cand[run_heads]
+        b = cand[np.append(run_heads[1:], len(cand)) - 1]
+        if keep == 'last':
+            firsts.append(a)
+            lasts.append(b + length)
+        else:
+            firsts.append(a + length)
+            lasts.append(b + 2 * length)
+
+    if not firsts:
+        return empty, empty
+
+    # 不同长度的区间可能重叠，按 token 取并集
+    cover = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(cover, np.concatenate(firsts), 1)
+    np.add.at(cover, np.concatenate(lasts), -1)
+    deleted = np.cumsum(cover[:-1]) > 0
+    edges = np.diff(deleted.astype(np.int8), prepend=0, append=0)
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def range_spans(starts: np.ndarray, ends: np.ndarray, first: np.ndarray,
+                last: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """token 区间 [first, last) 的时间段：首 token 开始到末 token 结束"""
+    return starts[first], ends[last - 1]
+
+
+# ===== 删除区间 =====
+
+def neighbour_spans(starts: np.ndarray, ends: np.ndarray, idx: np.ndarray,
+                    last: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    从前一个 token 结束到后一个 token 开始（首尾 token 用自身边界）
+
+    last 为多 token 匹配的尾后下标，默认 idx + 1（单个 token）。
+    """
+    n = len(starts)
+    last = idx + 1 if last is None else last
+    s = np.where(idx > 0, ends[np.maximum(idx - 1, 0)], starts[idx])
+    e = np.where(last < n, starts[np.minimum(last, n - 1)], ends[last - 1])
+    return s, e
+
+
+def buffered_spans(starts: np.ndarray, ends: np.ndarray, idx: np.ndarray, buffer_ms: int,
+                   last: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """token（或 [idx, last) 区间）前后各加缓冲（开始不小于 0）"""
+    last = idx + 1 if last is None else last
+    return np.maximum(starts[idx] - buffer_ms, 0), ends[last - 1] + buffer_ms
+
+
+def token_spans(starts: np.ndarray, ends: np.ndarray, idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """token 自身的时间段"""
+    return starts[idx], ends[idx]
+
+
+def silence_spans(starts: np.ndarray, ends: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """片头静音（严格大于阈值）+ 相邻 token 间隔不小于阈值的静音"""
+    if not len(starts):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    gap_idx = np.flatnonzero(starts[1:] - ends[:-1] >= threshold)
+    s, e = ends[gap_idx], starts[gap_idx + 1]
+    if starts[0] > threshold:
+        s = np.concatenate(([0], s))
+        e = np.concatenate(([starts[0]], e))
+    return s, e
+
+
+def concat_spans(*spans: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """按给定顺序拼接多组区间（与原先 to_delete 的追加顺序一致）"""
+    if not spans:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return (np.concatenate([s for s, _ in spans]).astype(np.int64),
+            np.concatenate([e for _, e in spans]).astype(np.int64))
+
+
+def to_pairs(s: np.ndarray, e: np.ndarray) -> List[Tuple[int, int]]:
+    """区间数组 → [(start, end)]（Python int）"""
+    return list(zip(s.tolist(), e.tolist()))
+
+
+# ===== 合并与保留段 =====
+
+def merge_intervals(s: np.ndarray, e: np.ndarray, tolerance: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    排序 + 扫描合并区间：开始时间不超过前面区间最大结束时间 + tolerance 即并入
+
+    前面所有区间的累积最大结束时间用 np.maximum.accumulate 一次算出，
+    每组的结束时间用 np.maximum.reduceat 取组内最大值。
+    """
+    if not len(s):
+        return s, e
+    order = np.argsort(s, kind='stable')
+    s, e = s[order], e[order]
+    running_end = np.maximum.accumulate(e)
+    new_group = np.empty(len(s), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = s[1:] > running_end[:-1] + tolerance
+    heads = np.flatnonzero(new_group)
+    return s[heads], np.maximum.reduceat(e, heads)
+
+
+def compute_keeps(merged_s: np.ndarray, merged_e: np.ndarray, duration_ms: float) -> List[Tuple[float, float]]:
+    """
+    删除段之外的保留段（秒）
+
+    与原逐段循环的结果逐值相同：尚未推进时起点保持整数 0。
+    """
+    ms = merged_s / 1000.0
+    me = merged_e / 1000.0
+    prev_end = np.concatenate(([0.0], np.maximum.accumulate(me)[:-1])) if len(me) else np.zeros(0)
+    prev_end = np.maximum(prev_end, 0.0)
+    gap = np.flatnonzero(ms > prev_end)
+
+    keeps = [(0 if p == 0 else p, x) for p, x in zip(prev_end[gap].tolist(), ms[gap].tolist())]
+    last = max(0.0, float(me.max())) if len(me) else 0.0
+    last = 0 if last == 0 else last
+    if last < duration_ms / 1000.0:
+        keeps.append((last, duration_ms / 1000.0))
+    return keeps
+
+
+# ===== 原逐字循环实现（用于一致性校验与基准对比） =====
+
+def reference_delete_list(tokens, starts, ends, fillers, remove_silence=False, threshold=1000):
+    """analyzer.analyze_transcript 原先的纯 Python 删除列表"""
+    n = len(starts)
+    to_delete = []
+    for i in range(n):
+        if tokens[i] in fillers:
+            start = ends[i-1] if i > 0 else starts[i]
+            end = starts[i+1] if i < n-1 else ends[i]
+            to_delete.append((start, end))
+    for i in range(n - 1):
+        if tokens[i] == tokens[i+1]:
+            to_delete.append((starts[i], ends[i]))
+    if remove_silence and n:
+        if starts[0] > threshold:
+            to_delete.append((0, starts[0]))
+        for i in range(n - 1):
+            if starts[i+1] - ends[i] >= threshold:
+                to_delete.append((ends[i], starts[i+1]))
+    return to_delete
+
+
+def reference_merge(to_delete, tolerance=0):
+    """原先的排序 + 逐段合并"""
+    to_delete = sorted(to_delete, key=lambda x: x[0])
+    merged = []
+    curr_s, curr_e = to_delete[0]
+    for s, e in to_delete[1:]:
+        if s <= curr_e + tolerance:
+            curr_e = max(curr_e, e)
+        else:
+            merged.append((curr_s, curr_e))
+            curr_s, curr_e = s, e
+    merged.append((curr_s, curr_e))
+    return merged
+
+
+def reference_keeps(merged, duration_ms):
+    """原先的保留段计算"""
+    keeps = []
+    curr_time = 0
+    for s, e in [(s/1000.0, e/1000.0) for s, e in merged]:
+        if s > curr_time:
+            keeps.append((curr_time, s))
+        curr_time = max(curr_time, e)
+    if curr_time < duration_ms/1000.0:
+        keeps.append((curr_time, duration_ms/1000.0))
+    return keeps
+
+
+def reference_repeat_mask(tokens, min_len=1, max_len=8, keep='last'):
+    """逐位置切片比较的重复片段检测（O(n * max_len^2)），用于校验 repeat_ranges"""
+    n = len(tokens)
+    deleted = [False] * n
+    for length in range(max(1, min_len), max_len + 1):
+        for i in range(n - 2 * length + 1):
+            if tokens[i:i + length] == tokens[i + length:i + 2 * length]:
+                head = i if keep == 'last' else i + length
+                deleted[head:head + length] = [True] * length
+    return deleted
+
+
+def delete_list(tokens, starts, ends, fillers, remove_silence=False, threshold=1000,
+                filler_ranges=None, repeat=None):
+    """
+    向量化版本的 analyzer 删除列表（顺序与 reference_delete_list 相同）
+
+    filler_ranges: 由 text_matcher 得到的语气词 token 区间 (first, last) 数组；
+                   不传时按整 token 等于语气词判断
+    repeat: repeat_ranges 的参数（min_len/max_len/keep）；不传时只删相邻重复的单个 token
+    """
+    starts, ends = as_int_array(starts), as_int_array(ends)
+    codes, vocab = token_codes(tokens)
+    if filler_ranges is None:
+        filler = neighbour_spans(starts, ends, np.flatnonzero(filler_mask(codes, word_codes(fillers, vocab))))
+    else:
+        first, last = filler_ranges
+        filler = neighbour_spans(starts, ends, np.asarray(first, dtype=np.int64), np.asarray(last, dtype=np.int64))
+    if repeat is None:
+        repeats = token_spans(starts, ends, np.flatnonzero(repeat_mask(codes)))
+    else:
+        repeats = range_spans(starts, ends, *repeat_ranges(codes, **repeat))
+    spans = [filler, repeats]
+    if remove_silence:
+        spans.append(silence_spans(starts, ends, threshold))
+    return concat_spans(*spans)
+
+
+def synthetic_transcript(n_chars: int, seed: int = 0):
+    """合成逐字转录：常用字 + 语气词 + 偶发重复字，字间随机停顿"""
+    rng = np.random.default_rng(seed)
+    alphabet = '的一是不了人我在有他这中大来上个国到说们为子和你地出道也时年嗯啊呃额哦'
+    picks = rng.integers(0, len(alphabet), n_chars)
+    text = ''.join(alphabet[i] for i in picks)
+    durations = rng.integers(80, 300, n_chars)
+    gaps = np.where(rng.random(n_chars) < 0.02, rng.integers(500, 3000, n_chars), rng.integers(0, 60, n_chars))
+    starts = np.cumsum(gaps + np.concatenate(([0], durations[:-1])))
+    ends = starts + durations
+    from array import array
+    return text, array('i', starts.tolist()), array('i', ends.tolist()), int(ends[-1]) + 500
+
+
+def benchmark(n_chars: int = 1_000_000, fillers=('嗯', '啊', '哎', '诶', '呃', '额', '唉', '哦', '噢', '呀', '欸', '那个', '然后', '就是')):
+    """对比原逐字循环与向量化实现的耗时，并校验删除列表、合并结果、保留段以及重复片段完全一致"""
+    text, starts, ends, duration_ms = synthetic_transcript(n_chars)
+    fillers = list(fillers)
+    print(f"\n📊 分析核心基准（合成逐字转录 {n_chars:,} 字）")
+
+    for remove_silence, tolerance in ((False, 0), (True, 0), (True, 150)):
+        t0 = time.time()
+        ref = reference_delete_list(text, starts, ends, fillers, remove_silence)
+        ref_merged = reference_merge(ref, tolerance)
+        ref_keeps = reference_keeps(ref_merged, duration_ms)
+        t_ref = time.time() - t0
+
+        t0 = time.time()
+        s, e = delete_list(text, starts, ends, fillers, remove_silence)
+        ms, me = merge_intervals(s, e, tolerance)
+        keeps = compute_keeps(ms, me, duration_ms)
+        t_vec = time.time() - t0
+
+        same = ref == to_pairs(s, e) and ref_merged == to_pairs(ms, me) and ref_keeps == keeps
+        label = f"静音={'开' if remove_silence else '关'} 合并容差={tolerance}ms"
+        print(f"  {label:<24} 原实现 {t_ref:6.2f} 秒  向量化 {t_vec:6.3f} 秒  "
+              f"加速 {t_ref / max(t_vec, 1e-9):5.1f}x  删除项 {len(ref):,}  一致: {'✅' if same else '❌'}")
+        if not same:
+            return False
+
+    for max_len in (4, 8):
+        t0 = time.time()
+        ref = reference_repeat_mask(text, 1, max_len)
+        t_ref = time.time() - t0
+
+        t0 = time.time()
+        first, last = repeat_ranges(token_codes(text)[0], 1, max_len)
+        t_vec = time.time() - t0
+
+        mask = np.zeros(len(text), dtype=bool)
+        for a, b in zip(first.tolist(), last.tolist()):
+            mask[a:b] = True
+        same = mask.tolist() == ref
+        label = f"重复片段 长度≤{max_len}"
+        print(f"  {label:<24} 原实现 {t_ref:6.2f} 秒  滚动哈希 {t_vec:6.3f} 秒  "
+              f"加速 {t_ref / max(t_vec, 1e-9):5.1f}x  删除区间 {len(first):,}  一致: {'✅' if same else '❌'}")
+        if not same:
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="向量化分析核心基准测试")
+    parser.add_argument("--benchmark", action="store_true", help="对比原实现与向量化实现")
+    parser.add_argument("--chars", type=int, default=1_000_000, help="合成转录的字数")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        sys.exit(0 if benchmark(args.chars) else 1)
+    parser.print_help()
@@ -1,7 +1,10 @@
-import json
 import sys
 import argparse
 
+import analysis_core
+import text_matcher
+from transcript_store import Transcript
+
 # 设置控制台编码为UTF-8
 if sys.platform == 'win32':
     import io
@@ -10,64 +13,32 @@ if sys.platform == 'win32':
 
 FILLER_WORDS = ['嗯', '啊', '哎', '诶', '呃', '额', '唉', '哦', '噢', '呀', '欸', '那个', '然后', '就是']
 
-def analyze_transcript(transcript_file, output_filter_file, remove_silence=False):
-    with open(transcript_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        
-    segments = data['segments']
-    to_delete = [] # milliseconds
-    
-    # 1. 语气词
-    for i, item in enumerate(segments):
-        if item['char'] in FILLER_WORDS:
-            start = segments[i-1]['end'] if i > 0 else item['start']
-            end = segments[i+1]['start'] if i < len(segments)-1 else item['end']
-            to_delete.append((start, end))
-            
-    # 2. 重复字
-    for i in range(len(segments) - 1):
-        if segments[i]['char'] == segments[i+1]['char']:
-             to_delete.append((segments[i]['start'], segments[i]['end']))
-             
-    # 3. 静音 (仅当启用时)
-    if remove_silence:
-        if segments[0]['start'] > 1000:
-            to_delete.append((0, segments[0]['start']))
-        for i in range(len(segments) - 1):
-            gap = segments[i+1]['start'] - segments[i]['end']
-            if gap >= 1000:
-                to_delete.append((segments[i]['end'], segments[i+1]['start']))
-                
+def analyze_transcript(transcript_file, output_filter_file, remove_silence=False, max_repeat_len=8, keep='last'):
+    transcript = Transcript.load(transcript_file)
+    chars, starts, ends = transcript.tokens, transcript.starts, transcript.ends
+
+    # 1. 语气词：本文件的 FILLER_WORDS 编译成一个自动机，全文扫描一次（多字语气词跨字匹配）；
+    #    config.yaml 的 filler_words 不做上下文判断直接删除会误删，只由 analyzer_complete 使用
+    matcher = text_matcher.get_matcher(FILLER_WORDS)
+    matches = text_matcher.match_tokens(transcript, matcher)
+    filler_ranges = ([m[0] for m in matches], [m[1] for m in matches])
+
+    # 2. 重复片段（「我们我们」只留最后一遍，滚动哈希检测）  3. 静音 (仅当启用时)——均为数组运算，单位毫秒
+    repeat = {'min_len': 1, 'max_len': max_repeat_len, 'keep': keep}
+    del_s, del_e = analysis_core.delete_list(chars, starts, ends, matcher.patterns, remove_silence,
+                                             filler_ranges=filler_ranges, repeat=repeat)
+
     # 合并时间段
-    if not to_delete:
+    if not len(del_s):
         print("未检测到需要删除的片段。")
         return []
-        
-    to_delete.sort(key=lambda x: x[0])
-    merged = []
-    curr_s, curr_e = to_delete[0]
-    for s, e in to_delete[1:]:
-        if s <= curr_e:
-            curr_e = max(curr_e, e)
-        else:
-            merged.append((curr_s, curr_e))
-            curr_s, curr_e = s, e
-    merged.append((curr_s, curr_e))
-    
+
+    merged_s, merged_e = analysis_core.merge_intervals(del_s, del_e)
+
     # 计算保留段
-    duration_ms = data['duration_ms']
-    keeps = []
-    curr_time = 0
-    merged_sec = [(s/1000.0, e/1000.0) for s, e in merged]
-    
-    for s, e in merged_sec:
-        if s > curr_time:
-            keeps.append((curr_time, s))
-        curr_time = max(curr_time, e)
-        
-    if curr_time < duration_ms/1000.0:
-        keeps.append((curr_time, duration_ms/1000.0))
-        
+    duration_ms = transcript.duration_ms
+    keeps = analysis_core.compute_keeps(merged_s, merged_e, duration_ms)
+
     # 生成 Filter
     if not keeps:
         print("❌ 警告：所有内容都被删除了！")
@@ -85,14 +56,17 @@ def analyze_transcript(transcript_file, output_filter_file, remove_silence=False
     with open(output_filter_file, 'w', encoding='utf-8') as f:
         f.write(filter_complex)
         
-    print(f"✅ 分析完成，检测到 {len(to_delete)} 处删除项。")
+    print(f"✅ 分析完成，检测到 {len(del_s)} 处删除项。")
     print(f"Filter 已保存至: {output_filter_file}")
+    return keeps
     
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("transcript", help="转录JSON文件")
     parser.add_argument("output", help="输出 Filter 文件")
     parser.add_argument("--remove-silence", action="store_true", help="是否删除静音")
+    parser.add_argument("--max-repeat-len", type=int, default=8, help="检测的最长重复片段（token 数）")
+    parser.add_argument("--keep", choices=analysis_core.REPEAT_KEEPS, default='last', help="重复片段保留哪一遍")
     args = parser.parse_args()
     
-    analyze_transcript(args.transcript, args.output, args.remove_silence)
+    analyze_transcript(args.transcript, args.output, args.remove_silence, args.max_repeat_len, args.keep)
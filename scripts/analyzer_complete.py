@@ -6,12 +6,17 @@
 3. 智能上下文判断
 """
 
-import json
 import sys
 import yaml
 import re
 from pathlib import Path
 
+import numpy as np
+
+import analysis_core
+import text_matcher
+from transcript_store import Transcript
+
 # 设置控制台编码为UTF-8（仅在直接运行时）
 if sys.platform == 'win32' and __name__ == '__main__':
     import io
@@ -134,11 +139,10 @@ def analyze_transcript(transcript_file, output_filter_file, config_file='config.
     # 加载配置
     config = load_config(config_file)
 
-    with open(transcript_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    segments = data['segments']
-    text = ''.join([s['char'] for s in segments])
+    transcript = Transcript.load(transcript_file)
+    chars, starts, ends = transcript.tokens, transcript.starts, transcript.ends
+    n = len(transcript)
+    text = transcript.text
 
     print("=" * 60)
     print("🎬 完整智能分析器")
@@ -162,36 +166,36 @@ def analyze_transcript(transcript_file, output_filter_file, config_file='config.
     filler_words = config.get('filler_words', [])
     print(f"  配置的语气词列表: {len(filler_words)} 个")
 
+    # 候选位置由语气词自动机在全文上一次扫描得到（多字语气词跨字匹配），只对候选做上下文判断
+    starts_arr, ends_arr = analysis_core.as_int_array(starts), analysis_core.as_int_array(ends)
+    codes, _ = analysis_core.token_codes(chars)
+    matcher = text_matcher.get_matcher(filler_words)
+
     potential_fillers = []
-    for i, seg in enumerate(segments):
-        if seg['char'] in filler_words:
-            # 获取上下文
-            start_idx = max(0, i - 10)
-            end_idx = min(len(segments), i + 11)
-            context = ''.join([s['char'] for s in segments[start_idx:end_idx]])
-            context_index = i - start_idx
-
-            # 获取前后文本
-            before_text = context[:context_index]
-            after_text = context[context_index + 1:]
-
-            # 上下文判断
-            should_delete, reason = is_filler_by_context(
-                seg['char'],
-                before_text,
-                after_text,
-                config
-            )
-
-            potential_fillers.append({
-                'index': i,
-                'char': seg['char'],
-                'start_ms': seg['start'],
-                'end_ms': seg['end'],
-                'context': context,
-                'should_delete': should_delete,
-                'reason': reason
-            })
+    for i0, i1, word in text_matcher.match_tokens(transcript, matcher):
+        # 获取上下文
+        before_text = ''.join(chars[max(0, i0 - 10):i0])
+        after_text = ''.join(chars[i1:min(n, i1 + 10)])
+        context = before_text + word + after_text
+
+        # 上下文判断
+        should_delete, reason = is_filler_by_context(
+            word,
+            before_text,
+            after_text,
+            config
+        )
+
+        potential_fillers.append({
+            'index': i0,
+            'end_index': i1,
+            'char': word,
+            'start_ms': starts[i0],
+            'end_ms': ends[i1 - 1],
+            'context': context,
+            'should_delete': should_delete,
+            'reason': reason
+        })
 
     print(f"  发现潜在语气词: {len(potential_fillers)} 个")
 
@@ -202,80 +206,55 @@ def analyze_transcript(transcript_file, output_filter_file, config_file='config.
     print(f"  保留语气词: {kept_count} 个")
     print()
 
-    # 3. 检测重复字
-    print("[3/3] 检测重复字...")
-    repeat_count = 0
-    repeat_deletions = []
-
-    for i in range(len(segments) - 1):
-        if segments[i]['char'] == segments[i+1]['char']:
-            repeat_count += 1
-            repeat_deletions.append((segments[i]['start'], segments[i]['end']))
-
-    print(f"  删除重复字: {repeat_count} 个")
+    # 3. 检测重复片段（「我们我们」「这个问题这个问题」等重说，默认只留最后一遍）
+    print("[3/3] 检测重复片段...")
+    repeat_config = config.get('repeat', {})
+    repeat_first, repeat_last = analysis_core.repeat_ranges(
+        codes,
+        min_len=repeat_config.get('min_len', 1),
+        max_len=repeat_config.get('max_len', 8),
+        keep=repeat_config.get('keep', 'last')
+    )
+    repeat_count = len(repeat_first)
+
+    print(f"  删除重复片段: {repeat_count} 处（{int((repeat_last - repeat_first).sum())} 个字）")
     print()
 
     # 4. 生成删除列表
     print("生成删除列表...")
-    to_delete = []
 
-    # 添加语气词删除
+    # 语气词（前后加缓冲）、重复片段、可选的静音，顺序与逐项追加时一致
     buffer_ms = int(config.get('buffer', {}).get('before', 0.05) * 1000)
-    for filler in potential_fillers:
-        if filler['should_delete']:
-            start = max(0, filler['start_ms'] - buffer_ms)
-            end = filler['end_ms'] + buffer_ms
-            to_delete.append((start, end))
-
-    # 添加重复字删除
-    for start, end in repeat_deletions:
-        to_delete.append((start, end))
+    deleted = [f for f in potential_fillers if f['should_delete']]
+    filler_first = np.array([f['index'] for f in deleted], dtype=np.int64)
+    filler_last = np.array([f['end_index'] for f in deleted], dtype=np.int64)
+    spans = [
+        analysis_core.buffered_spans(starts_arr, ends_arr, filler_first, buffer_ms, filler_last),
+        analysis_core.range_spans(starts_arr, ends_arr, repeat_first, repeat_last),
+    ]
 
     # 可选：静音删除
     remove_silence = config.get('silence', {}).get('enable', False)
     if remove_silence:
         threshold = config.get('silence', {}).get('threshold', 1.0) * 1000
-        if segments[0]['start'] > threshold:
-            to_delete.append((0, segments[0]['start']))
-        for i in range(len(segments) - 1):
-            gap = segments[i+1]['start'] - segments[i]['end']
-            if gap >= threshold:
-                to_delete.append((segments[i]['end'], segments[i+1]['start']))
-
-    if not to_delete:
+        spans.append(analysis_core.silence_spans(starts_arr, ends_arr, threshold))
+
+    del_s, del_e = analysis_core.concat_spans(*spans)
+    if not len(del_s):
         print("❌ 未检测到需要删除的片段")
         return []
 
-    # 合并时间段
-    to_delete.sort(key=lambda x: x[0])
-    merged = []
-    curr_s, curr_e = to_delete[0]
-    for s, e in to_delete[1:]:
-        if s <= curr_e + 150:  # 150ms内合并
-            curr_e = max(curr_e, e)
-        else:
-            merged.append((curr_s, curr_e))
-            curr_s, curr_e = s, e
-    merged.append((curr_s, curr_e))
+    # 合并时间段（150ms内合并）
+    merged_s, merged_e = analysis_core.merge_intervals(del_s, del_e, tolerance=150)
 
-    total_delete_time = sum(e - s for s, e in merged) / 1000.0
-    print(f"合并后删除段数: {len(merged)}")
+    total_delete_time = int((merged_e - merged_s).sum()) / 1000.0
+    print(f"合并后删除段数: {len(merged_s)}")
     print(f"总删除时长: {total_delete_time:.2f}秒")
     print()
 
     # 计算保留段
-    duration_ms = data['duration_ms']
-    keeps = []
-    curr_time = 0
-    merged_sec = [(s/1000.0, e/1000.0) for s, e in merged]
-
-    for s, e in merged_sec:
-        if s > curr_time:
-            keeps.append((curr_time, s))
-        curr_time = max(curr_time, e)
-
-    if curr_time < duration_ms/1000.0:
-        keeps.append((curr_time, duration_ms/1000.0))
+    duration_ms = transcript.duration_ms
+    keeps = analysis_core.compute_keeps(merged_s, merged_e, duration_ms)
 
     print(f"保留段数: {len(keeps)}")
     print()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+ASR 推理后端 - ONNX Runtime（可选 int8 量化）版 FunASR 链路，以及不挂 VAD 的批量 PyTorch 链路
+两者的 generate() 输出格式都与 PyTorch 版 AutoModel.generate 一致，
+便于 transcriber 在各后端间切换
+"""
+
+import sys
+import time
+import difflib
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+# 设置控制台编码为UTF-8（仅在直接运行时）
+if sys.platform == 'win32' and __name__ == '__main__':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+# 与 paraformer-zh / fsmn-vad / ct-punc 对应的 ModelScope 模型，首次使用时自动导出 ONNX
+ONNX_MODELS = {
+    'asr': 'damo/speech_paraformer-large-vad-punc_asr_nat-zh-cn-16k-common-vocab8404-pytorch',
+    'vad': 'damo/speech_fsmn_vad_zh-cn-16k-common-pytorch',
+    'punc': 'damo/punc_ct-transformer_zh-cn-common-vocab272727-pytorch',
+}
+
+
+def align_punctuation(raw_text: str, punc_text: str, timestamps: List[List[int]]):
+    """
+    把逐字时间戳对齐到加标点后的文本
+
+    ct-punc 只插入标点，不改动原字符：原字符沿用自己的时间戳，
+    插入的标点取前一个字的结束时间（零时长），保证 text[k] 与 timestamp[k] 一一对应。
+    无法对齐时（字数与时间戳数不一致、标点模型改动了原文）退回无标点文本。
+
+    Returns:
+        (text, timestamps)
+    """
+    if len(timestamps) != len(raw_text):
+        return raw_text, timestamps
+
+    aligned = []
+    j = 0
+    for ch in punc_text:
+        if j < len(raw_text) and ch == raw_text[j]:
+            aligned.append(timestamps[j])
+            j += 1
+        elif ch.isspace() or ch.isalnum():
+            return raw_text, timestamps
+        else:
+            prev_end = aligned[-1][1] if aligned else (timestamps[0][0] if timestamps else 0)
+            aligned.append([prev_end, prev_end])
+    if j != len(raw_text):
+        return raw_text, timestamps
+    return punc_text, aligned
+
+
+class OnnxFunASR:
+    """ONNX Runtime 版 FunASR 链路，generate() 返回 [{'text', 'timestamp'}, ...]"""
+
+    def __init__(self, quantize: bool = True, threads: int = 4, batch_size: int = 1):
+        from funasr_onnx import Paraformer, Fsmn_vad, CT_Transformer
+
+        self.quantize = quantize
+        self.asr = Paraformer(ONNX_MODELS['asr'], batch_size=batch_size,
+                              quantize=quantize, intra_op_num_threads=threads)
+        self.vad = Fsmn_vad(ONNX_MODELS['vad'], quantize=quantize, intra_op_num_threads=threads)
+        self.punc = CT_Transformer(ONNX_MODELS['punc'], quantize=quantize, intra_op_num_threads=threads)
+
+    def _recognize(self, audio: np.ndarray, batch_size: int) -> Dict:
+        """单段音频：VAD 切分 → 批量识别 → 拼接时间戳 → 加标点"""
+        vad_res = self.vad(audio)
+        spans = vad_res[0] if vad_res else []
+        if not spans:
+            spans = [[0, len(audio) * 1000 // 16000]]
+
+        pieces = [audio[int(s * 16):int(e * 16)] for s, e in spans]
+        raw_text = ''
+        timestamps = []
+        for i in range(0, len(pieces), max(1, batch_size)):
+            results = self.asr(pieces[i:i + batch_size])
+            for (seg_start, _), res in zip(spans[i:i + batch_size], results):
+                text = res.get('preds', '')
+                if isinstance(text, (list, tuple)):
+                    text = text[0]
+                raw_text += text.replace(' ', '')
+                for ts in res.get('timestamp', []):
+                    timestamps.append([seg_start + ts[0], seg_start + ts[1]])
+
+        punc_text = self.punc(raw_text)[0] if raw_text else ''
+        text, timestamps = align_punctuation(raw_text, punc_text, timestamps)
+        return {'text': text, 'raw_text': raw_text, 'timestamp': timestamps}
+
+    def generate(self, input, batch_size: int = 1, **kwargs) -> List[Dict]:
+        """与 AutoModel.generate 相同的调用方式（input 为单个或多个 PCM 数组）"""
+        inputs = input if isinstance(input, list) else [input]
+        return [self._recognize(np.asarray(audio, dtype=np.float32), batch_size) for audio in inputs]
+
+
+class BatchedFunASR:
+    """
+    已切好语音段时使用的 PyTorch 链路：paraformer 不挂 VAD，多段真正按 batch_size 一次前向，
+    再逐段用 ct-punc 加标点并对齐时间戳
+
+    挂了 vad_model 的 AutoModel 会走 inference_with_vad，逐个输入处理、按 batch_size_s 组批，
+    传入的 batch_size 实际不起作用；transcriber 的能量 VAD 已经完成切分，不需要再做一遍。
+    """
+
+    def __init__(self, model: str = "paraformer-zh", punc_model: str = "ct-punc"):
+        from funasr import AutoModel
+
+        self.asr = AutoModel(model=model, disable_update=True)
+        self.punc = AutoModel(model=punc_model, disable_update=True) if punc_model else None
+
+    def _punctuate(self, raw_text: str, timestamps: List[List[int]]):
+        if not raw_text or self.punc is None:
+            return raw_text, timestamps
+        res = self.punc.generate(input=raw_text)
+        punc_text = res[0].get('text', raw_text) if res else raw_text
+        return align_punctuation(raw_text, punc_text.replace(' ', ''), timestamps)
+
+    def generate(self, input, batch_size: int = 1, **kwargs) -> List[Dict]:
+        """与 AutoModel.generate 相同的调用方式（input 为单个或多个 PCM 数组）"""
+        inputs = input if isinstance(input, list) else [input]
+        results = self.asr.generate(input=inputs, batch_size=max(1, batch_size))
+        outputs = []
+        for res in results:
+            raw_text = res.get('text', '').replace(' ', '')
+            timestamps = [list(ts) for ts in res.get('timestamp', [])]
+            text, timestamps = self._punctuate(raw_text, timestamps)
+            outputs.append({'text': text, 'raw_text': raw_text, 'timestamp': timestamps})
+        return outputs
+
+
+def align_chars(ref: List[Dict], test: List[Dict]) -> List[tuple]:
+    """
+    按文本对齐两组字符结果（多字、漏字不会让后面的字整体错位）
+
+    Returns:
+        [(ref 字符, test 字符)]，只包含两边相同且对齐上的字
+    """
+    matcher = difflib.SequenceMatcher(None, [c['char'] for c in ref], [c['char'] for c in test],
+                                      autojunk=False)
+    return [
+        (ref[block.a + k], test[block.b + k])
+        for block in matcher.get_matching_blocks()
+        for k in range(block.size)
+    ]
+
+
+def compare_backends(video_path: str, seconds: float = 120, quantize: bool = True) -> Dict:
+    """
+    一致性与速度对比：同一段音频分别用 PyTorch 与 ONNX 后端转录
+
+    Returns:
+        {'text_match', 'mean_start_diff_ms', 'max_start_diff_ms', 'torch_rtf', 'onnx_rtf'}
+    """
+    import transcriber
+    import model_pool
+
+    pcm = transcriber.decode_audio(video_path)[:int(seconds * transcriber.SAMPLE_RATE)]
+    batch = list(transcriber.iter_speech_chunks(pcm))
+    audio_sec = len(pcm) / transcriber.SAMPLE_RATE
+
+    outputs = {}
+    rtfs = {}
+    # 分段已由能量 VAD 完成，PyTorch 侧与流式转录一样使用不挂 VAD 的批量链路
+    for kind, params in (('funasr_batch', {}), ('funasr_onnx', {'quantize': quantize})):
+        with model_pool.default_pool.lease(kind, **params) as model:
+            t0 = time.perf_counter()
+            chars = [c for result in transcriber._infer_batch(model, batch) for c in result]
+            rtfs[kind] = (time.perf_counter() - t0) / audio_sec if audio_sec else 0
+        outputs[kind] = chars
+
+    ref, test = outputs['funasr_batch'], outputs['funasr_onnx']
+    pairs = align_chars(ref, test)
+    diffs = [abs(a['start'] - b['start']) for a, b in pairs]
+    report = {
+        'chars_torch': len(ref),
+        'chars_onnx': len(test),
+        'text_match': len(pairs) / max(len(ref), len(test), 1),
+        'mean_start_diff_ms': sum(diffs) / len(diffs) if diffs else 0,
+        'max_start_diff_ms': max(diffs) if diffs else 0,
+        'torch_rtf': rtfs['funasr_batch'],
+        'onnx_rtf': rtfs['funasr_onnx'],
+    }
+
+    print(f"\n📊 后端对比（前 {audio_sec:.0f} 秒，{'int8' if quantize else 'float32'} ONNX）")
+    print(f"  字符数: PyTorch {report['chars_torch']} / ONNX {report['chars_onnx']}")
+    print(f"  文本一致率: {report['text_match'] * 100:.1f}%")
+    print(f"  时间戳偏差: 平均 {report['mean_start_diff_ms']:.0f}ms, 最大 {report['max_start_diff_ms']}ms")
+    print(f"  RTF: PyTorch {report['torch_rtf']:.3f} / ONNX {report['onnx_rtf']:.3f}"
+          f" (加速 {report['torch_rtf'] / report['onnx_rtf'] if report['onnx_rtf'] else 0:.2f}x)")
+    return report
+
+
+def check_alignment() -> bool:
+    """
+    自检：构造带标点的 ONNX 结果，经 transcriber._collect_chars 换算后
+    每个字必须保持自己的时间戳（不需要模型与音频）
+    """
+    import transcriber
+
+    raw = '今天我们讲一下这个问题好吗'
+    stamps = [[i * 200, i * 200 + 150] for i in range(len(raw))]
+
+    backend = OnnxFunASR.__new__(OnnxFunASR)
+    backend.vad = lambda audio: [[[0, 3000]]]
+    backend.asr = lambda pieces: [{'preds': raw, 'timestamp': stamps} for _ in pieces]
+    backend.punc = lambda text: ('今天，我们讲一下这个问题。好吗？', None)
+
+    chars = []
+    transcriber._collect_chars(backend.generate(np.zeros(16000 * 3, dtype=np.float32)), 0, chars)
+
+    own = [(c['char'], c['start'], c['end']) for c in chars if c['char'] in raw]
+    expected = [(ch, s, e) for ch, (s, e) in zip(raw, stamps)]
+    ok = own == expected and ''.join(c['char'] for c in chars) == '今天，我们讲一下这个问题。好吗？'
+
+    # 时间戳数与字数不一致时退回无标点文本，仍然逐字对应
+    backend.asr = lambda pieces: [{'preds': raw, 'timestamp': stamps[:-1]} for _ in pieces]
+    chars = []
+    transcriber._collect_chars(backend.generate(np.zeros(16000 * 3, dtype=np.float32)), 0, chars)
+    ok = ok and [(c['char'], c['start']) for c in chars] == [(ch, s) for ch, (s, _) in zip(raw, stamps[:-1])]
+
+    print(f"{'✅' if ok else '❌'} ONNX 标点时间戳对齐自检{'通过' if ok else '失败'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="ASR 后端对比 - PyTorch 与 ONNX Runtime 的一致性和实时率"
+    )
+    parser.add_argument("video", nargs='?', help="输入视频")
+    parser.add_argument("--seconds", type=float, default=120, help="对比的音频时长（秒）")
+    parser.add_argument("--float32", action="store_true", help="ONNX 不量化")
+    parser.add_argument("--max-diff", type=float, default=None,
+                        help="平均时间戳偏差上限（毫秒），超出时返回非零退出码")
+    parser.add_argument("--self-check", action="store_true", help="只运行标点时间戳对齐自检（无需模型）")
+    args = parser.parse_args()
+
+    if args.self_check:
+        sys.exit(0 if check_alignment() else 1)
+    if not args.video:
+        parser.error("需要输入视频（或使用 --self-check）")
+
+    report = compare_backends(args.video, args.seconds, quantize=not args.float32)
+    if args.max_diff is not None and report['mean_start_diff_ms'] > args.max_diff:
+        print(f"❌ 时间戳偏差超出 {args.max_diff}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
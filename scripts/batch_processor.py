@@ -68,6 +68,15 @@ class BatchProcessor:
 
         os.makedirs(output_dir, exist_ok=True)
 
+        # 预热模型：整个批次只加载一次，各线程共享
+        import importlib.util
+        spec = importlib.util.spec_from_file_location("all_in_one", "all_in_one.py")
+        aio = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(aio)
+
+        warm_pipeline = aio.VideoCutterPipeline(self.config_path)
+        warm_pipeline.warm_up_models()
+
         # 并行处理
         completed = 0
         failed = 0
@@ -106,6 +115,8 @@ class BatchProcessor:
                     print(f"❌ [{completed + failed}/{len(video_files)}] {os.path.basename(video_path)}")
                     print(f"   异常: {e}")
 
+        warm_pipeline.evict_models()
+
         # 打印总结
         self._print_summary(completed, failed, output_dir)
 
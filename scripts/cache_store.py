@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+内容寻址缓存 - 按源文件指纹 + 处理参数缓存中间产物
+原子写入、按字节上限做 LRU 淘汰、统计命中率
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# 进程内指纹缓存：(绝对路径, 大小, 修改时间) -> 指纹
+_fingerprint_memo: Dict[tuple, str] = {}
+_memo_lock = threading.Lock()
+
+
+def file_fingerprint(path: str, content_hash: bool = True) -> str:
+    """
+    计算媒体文件指纹
+
+    Args:
+        path: 文件路径
+        content_hash: True 时对文件内容做 SHA-256；False 时只用路径、大小和修改时间
+
+    Returns:
+        十六进制指纹字符串
+    """
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns, content_hash)
+
+    with _memo_lock:
+        if memo_key in _fingerprint_memo:
+            return _fingerprint_memo[memo_key]
+
+    h = hashlib.sha256()
+    if content_hash:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(block)
+    else:
+        h.update(repr(memo_key[:3]).encode('utf-8'))
+    digest = h.hexdigest()
+
+    with _memo_lock:
+        _fingerprint_memo[memo_key] = digest
+    return digest
+
+
+def make_key(*parts) -> str:
+    """把任意可 JSON 序列化的参数组合成缓存键"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CacheStore:
+    """单个命名空间下的文件缓存"""
+
+    def __init__(self, cache_dir: str, namespace: str, max_bytes: int = None):
+        self.dir = os.path.join(cache_dir, namespace)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.dir, f"{key}{suffix}")
+
+    def record(self, hit: bool):
+        """记录一次查找结果"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str, suffix: str = '', record: bool = True) -> Optional[str]:
+        """查找缓存，命中时刷新其 LRU 时间并返回路径"""
+        path = self._path(key, suffix)
+        hit = os.path.exists(path)
+        if hit:
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+
+        if record:
+            self.record(hit)
+        return path if hit else None
+
+    def put_file(self, key: str, src_path: str, suffix: str = '') -> str:
+        """原子写入：先复制到同目录临时文件，再 os.replace"""
+        path = self._path(key, suffix)
+        fd, tmp_path = tempfile.mkstemp(dir=self.dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self.evict()
+        return path
+
+    def evict(self) -> int:
+        """超出字节上限时按最近使用时间淘汰最旧条目，返回淘汰数量"""
+        if not self.max_bytes:
+            return 0
+
+        entries = []
+        total = 0
+        for name in os.listdir(self.dir):
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(self.dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def stats(self) -> Dict:
+        """命中/未命中计数"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+class TranscriptCache:
+    """转录结果缓存：键 = 媒体指纹 + ASR 后端 + 模型 + 参数"""
+
+    def __init__(self, config: Dict):
+        cache_config = config.get('cache', {})
+        self.enabled = cache_config.get('enable', False)
+        self.content_hash = cache_config.get('transcript_hash', True)
+        max_mb = cache_config.get('max_size_mb', 2048)
+        self.store = None
+        if self.enabled:
+            self.store = CacheStore(
+                cache_config.get('dir', '.cache'),
+                'transcripts',
+                int(max_mb * 1024 * 1024) if max_mb else None
+            )
+
+    def key(self, video_path: str, backend: str, model: str, params: Dict) -> str:
+        fingerprint = file_fingerprint(video_path, self.content_hash)
+        return make_key(fingerprint, backend, model, params)
+
+    def lookup(self, video_path: str, output_json: str, variants: List[Tuple[str, str, Dict]]) -> Optional[str]:
+        """
+        依次查找各个 (后端, 模型, 参数) 组合，命中时把缓存的转录复制到 output_json
+
+        Returns:
+            命中的后端名称，未命中返回 None
+        """
+        if not self.store:
+            return None
+        for backend, model, params in variants:
+            path = self.store.get(self.key(video_path, backend, model, params), '.json', record=False)
+            if path:
+                self.store.record(True)
+                shutil.copyfile(path, output_json)
+                return backend
+
+        self.store.record(False)
+        return None
+
+    def save(self, video_path: str, output_json: str, backend: str, model: str, params: Dict):
+        """保存转录结果"""
+        if self.store and os.path.exists(output_json):
+            self.store.put_file(self.key(video_path, backend, model, params), output_json, '.json')
+
+    def stats(self) -> Dict:
+        return self.store.stats() if self.store else {'hits': 0, 'misses': 0, 'hit_rate': 0.0}
+
+
+class ArtifactCache:
+    """
+    渲染产物缓存（GIF / 片段）：键 = 媒体指纹 + 区间 + 渲染参数
+
+    命中时优先硬链接到输出目录（同一文件系统下零拷贝），否则复制。
+    """
+
+    def __init__(self, config: Dict, namespace: str = 'gifs'):
+        cache_config = config.get('cache', {})
+        self.enabled = cache_config.get('enable', False) and cache_config.get('artifacts', True)
+        self.content_hash = cache_config.get('transcript_hash', True)
+        max_mb = cache_config.get('artifact_max_mb', 1024)
+        self.store = None
+        if self.enabled:
+            self.store = CacheStore(
+                cache_config.get('dir', '.cache'),
+                namespace,
+                int(max_mb * 1024 * 1024) if max_mb else None
+            )
+
+    def key(self, video_path: str, params: Dict) -> str:
+        return make_key(file_fingerprint(video_path, self.content_hash), params)
+
+    def fetch(self, key: str, dest_path: str, suffix: str = '') -> bool:
+        """命中时把缓存产物放到 dest_path，返回是否命中"""
+        if not self.store:
+            return False
+        path = self.store.get(key, suffix)
+        if not path:
+            return False
+
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(path, dest_path)
+        except OSError:
+            shutil.copyfile(path, dest_path)
+        return True
+
+    def save(self, key: str, src_path: str, suffix: str = ''):
+        """保存渲染产物"""
+        if self.store and os.path.exists(src_path):
+            self.store.put_file(key, src_path, suffix)
+
+    def stats(self) -> Dict:
+        return self.store.stats() if self.store else {'hits': 0, 'misses': 0, 'hit_rate': 0.0}
@@ -1,6 +1,15 @@
 import sys
 import subprocess
 import os
+import re
+import time
+import shutil
+import tempfile
+import json
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left, bisect_right
+
+import ffmpeg_runner
 
 # 设置控制台编码为UTF-8（仅在直接运行时）
 if sys.platform == 'win32' and __name__ == '__main__':
@@ -8,28 +17,845 @@ if sys.platform == 'win32' and __name__ == '__main__':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
-def clip_video(input_video, filter_file, output_video):
-    if not os.path.exists(filter_file):
-        print(f"❌ Filter 文件不存在: {filter_file}")
-        return
-        
-    print(f"✂️ 开始剪辑: {input_video}")
+def escape_filter_value(value):
+    """
+    滤镜参数值的两级转义：先转义选项值中的 \\ ' :，再转义滤镜图中的 \\ ' [ ] , ;
+    用于把任意路径安全地放进 -vf / filter_complex
+    """
+    for ch in "\\':":
+        value = value.replace(ch, '\\' + ch)
+    for ch in "\\'[],;":
+        value = value.replace(ch, '\\' + ch)
+    return value
+
+def subtitle_filter(subtitle_path):
+    """subtitles 滤镜表达式（路径统一用正斜杠，Windows 盘符冒号会被转义）"""
+    path = os.path.abspath(subtitle_path).replace('\\', '/')
+    return f"subtitles=filename={escape_filter_value(path)}"
+
+def add_subtitle_overlay(filter_file, subtitle_path, output_file):
+    """
+    在分析器生成的 Filter 末尾接上字幕叠加，字幕时间需已对齐剪辑后的时间轴
+
+    Returns:
+        (新 Filter 文件, 视频输出标签)
+    """
+    with open(filter_file, 'r', encoding='utf-8') as f:
+        graph = f.read().strip().rstrip(';')
+
+    graph += f";[outv]{subtitle_filter(subtitle_path)}[outvs]"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(graph)
+    return output_file, '[outvs]'
+
+# 剪辑引擎：filter 为单个 filter_complex；concat 为分组渲染后用 concat demuxer 无损拼接
+ENGINES = ('auto', 'filter', 'concat')
+CONCAT_THRESHOLD = 200
+GROUP_SIZE = 50
+
+_TRIM = re.compile(r'trim=start=([\d.eE+-]+):end=([\d.eE+-]+)')
+_CHAIN_LABEL = re.compile(r'\[([va])(\d+)\]$')
+_FADE_IN = re.compile(r',afade=t=in:[^,\[]*')
+_FADE_OUT = re.compile(r',afade=t=out:st=([\d.eE+-]+):d=([\d.eE+-]+)')
+# 并行切分时保留段两侧至少保留的长度（秒），避免切出过短的片段或切进淡出区
+MIN_SPLIT_SEC = 1.0
+
+def parse_filter_script(filter_file):
+    """
+    解析分析器生成的 Filter，按保留段拆出各自的视频/音频滤镜链
+
+    Returns:
+        [{'start', 'end', 'v', 'a'}]，v/a 为原样的滤镜链文本（含淡入淡出等）
+    """
+    with open(filter_file, 'r', encoding='utf-8') as f:
+        chains = [c for c in f.read().strip().split(';') if c]
+
+    segments = {}
+    for chain in chains:
+        label = _CHAIN_LABEL.search(chain)
+        if not label:
+            continue  # 末尾的 concat
+        kind, idx = label.group(1), int(label.group(2))
+        seg = segments.setdefault(idx, {})
+        seg[kind] = chain
+        if kind == 'v':
+            trim = _TRIM.search(chain)
+            seg['start'], seg['end'] = float(trim.group(1)), float(trim.group(2))
+
+    return [segments[i] for i in sorted(segments)]
+
+def _video_filters(chain):
+    """滤镜链中的滤镜名：'[0:v]trim=...,setpts=...,fade=...[v0]' → ['trim', 'setpts', 'fade']"""
+    body = chain[chain.find(']') + 1:chain.rfind('[')]
+    return [f.split('=', 1)[0].strip() for f in body.split(',') if f.strip()]
+
+def write_filter_script(keeps, filter_file):
+    """按保留段写出与分析器相同格式的 Filter（基准测试用）"""
+    filter_complex = ""
+    inputs = ""
+    for i, (start, end) in enumerate(keeps):
+        filter_complex += f"[0:v]trim=start={start}:end={end},setpts=PTS-STARTPTS[v{i}];"
+        filter_complex += f"[0:a]atrim=start={start}:end={end},asetpts=PTS-STARTPTS[a{i}];"
+        inputs += f"[v{i}][a{i}]"
+    filter_complex += f"{inputs}concat=n={len(keeps)}:v=1:a=1[outv][outa]"
+
+    with open(filter_file, 'w', encoding='utf-8') as f:
+        f.write(filter_complex)
+
+def kept_duration(segments):
+    """剪辑后成片时长（秒）"""
+    return sum(seg['end'] - seg['start'] for seg in segments)
+
+def select_engine(num_segments, engine='auto', threshold=CONCAT_THRESHOLD):
+    """保留段数超过阈值时自动改用 concat 引擎"""
+    if engine not in ENGINES:
+        raise ValueError(f"未知剪辑引擎: {engine}")
+    if engine == 'auto':
+        return 'concat' if num_segments > threshold else 'filter'
+    return engine
+
+def _clip_filter(input_video, filter_file, output_video, subtitle_path=None, duration=None):
+    """单个 filter_complex 一次完成所有剪辑"""
+    video_label = '[outv]'
+    if subtitle_path:
+        # 字幕与剪辑在同一次编码中完成，避免再解码/编码一遍
+        filter_file, video_label = add_subtitle_overlay(
+            filter_file, subtitle_path, filter_file + '.sub.txt'
+        )
+        print(f"🔥 同时烧录字幕: {subtitle_path}")
+
     cmd = [
         'ffmpeg', '-y',
         '-i', input_video,
         '-filter_complex_script', filter_file,
-        '-map', '[outv]', '-map', '[outa]',
+        '-map', video_label, '-map', '[outa]',
         output_video
     ]
-    
+    ffmpeg_runner.run_ffmpeg(cmd, duration, label='剪辑')
+
+def _split_segment(seg, at):
+    """在 at 秒处把一个保留段切成两段；淡入留在前段，淡出移到后段"""
+    head = dict(seg, end=at)
+    tail = dict(seg, start=at)
+    for part in (head, tail):
+        part['v'] = _TRIM.sub(f"trim=start={part['start']}:end={part['end']}", seg['v'])
+        part['a'] = _TRIM.sub(f"trim=start={part['start']}:end={part['end']}", seg['a'])
+
+    shift = at - seg['start']
+    head['a'] = _FADE_OUT.sub('', head['a'])
+    tail['a'] = _FADE_OUT.sub(
+        lambda m: f",afade=t=out:st={max(round(float(m.group(1)) - shift, 3), 0)}:d={m.group(2)}",
+        _FADE_IN.sub('', tail['a'])
+    )
+    return head, tail
+
+def balance_segments(segments, n):
+    """
+    按剪辑后的时长把保留段均分为 n 块，块边界落在段内时切开该段
+
+    Returns:
+        [[seg, ...], ...]，块数不超过 n
+    """
+    total = kept_duration(segments)
+    target = total / max(n, 1)
+    chunks = [[]]
+    pos = 0.0
+    k = 1
+    for seg in segments:
+        while k < n and pos + (seg['end'] - seg['start']) > k * target:
+            cut = round(seg['start'] + (k * target - pos), 3)
+            if cut - seg['start'] >= MIN_SPLIT_SEC and seg['end'] - cut >= MIN_SPLIT_SEC:
+                head, seg = _split_segment(seg, cut)
+                chunks[-1].append(head)
+                pos += head['end'] - head['start']
+            chunks.append([])
+            k += 1
+        chunks[-1].append(seg)
+        pos += seg['end'] - seg['start']
+    return [chunk for chunk in chunks if chunk]
+
+# concat 引擎分组视频片段的封装：默认 MPEG-TS + H.264，拼接时无编辑列表/起始偏移问题
+VIDEO_PARTS = {
+    '.webm': ('.webm', ['-c:v', 'libvpx-vp9', '-row-mt', '1', '-crf', '31', '-b:v', '0']),
+}
+DEFAULT_VIDEO_PART = ('.ts', ['-c:v', 'libx264', '-f', 'mpegts'])
+
+def _render_group(input_video, group, part_path, audio_path, script_path, offset=0.0, subtitle_path=None,
+                  threads=0, video_args=()):
+    """
+    渲染一组相邻保留段：输入端 -ss 快速定位到组起点，-copyts -start_at_zero 保留
+    与 filter 引擎一致的时间戳，因此原 Filter 中的 trim 绝对时间可以原样使用
+
+    视频写入 part_path；音频写成无压缩 PCM（audio_path），拼接后统一编码一次，
+    避免每组 AAC 各自的编码器延迟（priming）在组间累积成音画不同步
+    """
+    start, end = group[0]['start'], group[-1]['end']
+    graph = [seg['v'] for seg in group] + [seg['a'] for seg in group]
+    inputs = ''.join(f"{_CHAIN_LABEL.search(seg['v']).group(0)}{_CHAIN_LABEL.search(seg['a']).group(0)}"
+                     for seg in group)
+    graph.append(f"{inputs}concat=n={len(group)}:v=1:a=1[outv][outa]")
+
+    video_label = '[outv]'
+    if subtitle_path:
+        # 字幕时间轴为剪辑后的全片时间，组内时间戳需先平移到该组在成片中的位置
+        graph.append(f"[outv]setpts=PTS+{offset}/TB,{subtitle_filter(subtitle_path)},"
+                     f"setpts=PTS-STARTPTS[outvs]")
+        video_label = '[outvs]'
+
+    with open(script_path, 'w', encoding='utf-8') as f:
+        f.write(';'.join(graph))
+
+    cmd = [
+        'ffmpeg', '-y', '-copyts', '-start_at_zero',
+        '-ss', f"{start:.3f}", '-t', f"{end - start:.3f}",
+        '-i', input_video,
+        '-filter_complex_script', script_path,
+    ]
+    if threads:
+        # 并行时限制每个进程的编码/滤镜线程，避免互相争抢
+        cmd += ['-threads', str(threads), '-filter_complex_threads', str(threads)]
+    cmd += ['-map', video_label, '-an'] + list(video_args) + [part_path]
+    cmd += ['-map', '[outa]', '-vn', '-c:a', 'pcm_s16le', audio_path]
+    ffmpeg_runner.run_ffmpeg(cmd, kept_duration(group), label=os.path.basename(part_path), style='none')
+
+def _write_concat_list(list_file, paths):
+    with open(list_file, 'w', encoding='utf-8') as f:
+        f.write("ffconcat version 1.0\n")
+        for path in paths:
+            f.write(f"file '{os.path.basename(path)}'\n")
+
+def _clip_concat(input_video, segments, output_video, subtitle_path=None, group_size=GROUP_SIZE,
+                 workers=1, threads=0):
+    """
+    分组渲染后用 concat demuxer 拼接：每组的 Filter 只有 group_size 个保留段，
+    视频分段编码参数一致，拼接为流复制；各组音频为 PCM，拼接后只编码一次
+
+    workers > 1 时先按剪辑后时长均分为 workers 块，各组由多个 ffmpeg 进程并行编码。
+    """
+    ext = os.path.splitext(output_video)[1].lower() or '.mp4'
+    part_ext, video_args = VIDEO_PARTS.get(ext, DEFAULT_VIDEO_PART)
+    if workers > 1:
+        chunks = balance_segments(segments, workers)
+        threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    else:
+        chunks = [segments]
+    groups = [chunk[i:i + group_size] for chunk in chunks for i in range(0, len(chunk), group_size)]
+
+    work_dir = tempfile.mkdtemp(prefix='clip_', dir=os.path.dirname(os.path.abspath(output_video)))
     try:
-        subprocess.run(cmd, check=True)
-        print(f"✅ 剪辑完成: {output_video}")
+        parts, audio_parts = [], []
+        offset = 0.0
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            futures = []
+            for g, group in enumerate(groups):
+                part = os.path.join(work_dir, f"part_{g:05d}{part_ext}")
+                audio_part = os.path.join(work_dir, f"part_{g:05d}.wav")
+                futures.append(ffmpeg_runner.submit(
+                    executor, _render_group, input_video, group, part, audio_part,
+                    os.path.join(work_dir, f"part_{g:05d}.txt"),
+                    offset, subtitle_path, threads if workers > 1 else 0, video_args
+                ))
+                parts.append(part)
+                audio_parts.append(audio_part)
+                offset += kept_duration(group)
+            for done, future in enumerate(futures, 1):
+                future.result()
+                print(f"   分组 {done}/{len(groups)} 完成", end='\r')
+        print()
+
+        video_list = os.path.join(work_dir, "parts.txt")
+        audio_list = os.path.join(work_dir, "audio_parts.txt")
+        _write_concat_list(video_list, parts)
+        _write_concat_list(audio_list, audio_parts)
+
+        cmd = [
+            'ffmpeg', '-y',
+            '-f', 'concat', '-safe', '0', '-i', video_list,
+            '-f', 'concat', '-safe', '0', '-i', audio_list,
+            '-map', '0:v', '-map', '1:a',
+            '-c:v', 'copy',
+            output_video
+        ]
+        ffmpeg_runner.run_ffmpeg(cmd, offset, label='拼接')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# ===== 智能渲染：关键帧之间整段流复制，只重编码剪辑点所在的不完整 GOP =====
+SMART_CODECS = {'h264': 'libx264'}
+SMART_CRF = 18
+# 小于该长度的复制段不值得单独拆出（秒）
+MIN_COPY_SEC = 0.5
+
+_keyframe_index = {}
+
+def probe_video_stream(video_path):
+    """读取首个视频流的编码参数（用于边界重编码时与原片保持一致）"""
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=codec_name,profile,level,refs,pix_fmt,width,height,r_frame_rate',
+        '-of', 'json', video_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    streams = json.loads(result.stdout).get('streams', [])
+    return streams[0] if streams else None
+
+def probe_keyframes(video_path):
+    """
+    关键帧时间索引（秒，升序），按文件路径 + 大小 + 修改时间缓存
+
+    只读取包头的 flags，不解码画面。
+    """
+    st = os.stat(video_path)
+    key = (os.path.abspath(video_path), st.st_size, st.st_mtime_ns)
+    if key not in _keyframe_index:
+        cmd = [
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        keyframes = []
+        for line in result.stdout.splitlines():
+            pts, _, flags = line.partition(',')
+            if 'K' in flags and pts not in ('', 'N/A'):
+                keyframes.append(float(pts))
+        _keyframe_index[key] = sorted(keyframes)
+    return _keyframe_index[key]
+
+def plan_smart_render(segments, keyframes, min_copy=MIN_COPY_SEC):
+    """
+    把每个保留段拆成 [头部重编码][关键帧之间流复制][尾部重编码]
+
+    Returns:
+        [(start, end, 'copy' | 'encode')]
+    """
+    pieces = []
+    for seg in segments:
+        start, end = seg['start'], seg['end']
+        # 段内第一个关键帧与最后一个关键帧
+        i = bisect_left(keyframes, start - 1e-3)
+        j = bisect_right(keyframes, end + 1e-3) - 1
+        if i < len(keyframes) and j >= i and keyframes[j] - keyframes[i] >= min_copy:
+            k1, k2 = max(keyframes[i], start), keyframes[j]
+            if k1 > start:
+                pieces.append((start, k1, 'encode'))
+            pieces.append((k1, k2, 'copy'))
+            if end > k2:
+                pieces.append((k2, end, 'encode'))
+        else:
+            pieces.append((start, end, 'encode'))
+    return pieces
+
+def _frame_duration(stream):
+    """单帧时长（秒），r_frame_rate 形如 30000/1001"""
+    num, _, den = str(stream.get('r_frame_rate') or '25/1').partition('/')
+    try:
+        return float(den or 1) / float(num)
+    except (ValueError, ZeroDivisionError):
+        return 0.04
+
+def _render_piece(input_video, start, end, mode, piece_path, encode_args, seek_pad=0.0):
+    """
+    渲染单个视频片段（不含音频），统一封装为 MPEG-TS 以便无损拼接
+
+    流复制从 -ss 之前最近的关键帧开始：定位点加 seek_pad（半帧），避免时间取整后
+    落在关键帧之前而多复制一整个 GOP。时间以微秒精度传入。
+    """
+    seek = start + seek_pad if mode == 'copy' else start
+    cmd = ['ffmpeg', '-y', '-ss', f"{seek:.6f}", '-i', input_video, '-t', f"{end - start:.6f}", '-an']
+    if mode == 'copy':
+        cmd += ['-c:v', 'copy', '-bsf:v', 'h264_mp4toannexb']
+    else:
+        cmd += encode_args
+    cmd += ['-f', 'mpegts', piece_path]
+    ffmpeg_runner.run_ffmpeg(cmd, end - start, label=f"{mode} {os.path.basename(piece_path)}", style='none')
+
+def _smart_encode_args(stream, crf=SMART_CRF):
+    """
+    与原片一致的编码参数：同编码器、profile、level、参考帧数、像素格式、分辨率与帧率
+
+    重编码片段与复制片段的 SPS 尽量一致，拼接后仍由 verify_smart_output 解码校验。
+    """
+    args = ['-c:v', SMART_CODECS[stream['codec_name']], '-preset', 'veryfast', '-crf', str(crf),
+            '-pix_fmt', stream.get('pix_fmt', 'yuv420p'),
+            '-s', f"{stream['width']}x{stream['height']}", '-r', stream['r_frame_rate']]
+    profile = (stream.get('profile') or '').lower().replace('constrained ', '')
+    if profile in ('baseline', 'main', 'high'):
+        args += ['-profile:v', profile]
+    level = stream.get('level')
+    if isinstance(level, int) and level > 0:
+        args += ['-level:v', f"{level / 10:.1f}"]
+    refs = stream.get('refs')
+    if isinstance(refs, int) and refs > 0:
+        args += ['-refs', str(refs)]
+    return args
+
+def probe_stream_duration(path, stream='v:0'):
+    """输出文件中某个流的时长（秒），获取失败返回 None"""
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', stream, '-show_entries', 'stream=duration',
+           '-of', 'default=noprint_wrappers=1:nokey=1', path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        return float(result.stdout.strip().splitlines()[0])
+    except (OSError, ValueError, IndexError, subprocess.CalledProcessError):
+        return None
+
+def av_drift(path):
+    """音频流与视频流的时长差（秒，正数表示音频更长），获取失败返回 None"""
+    video, audio = probe_stream_duration(path, 'v:0'), probe_stream_duration(path, 'a:0')
+    if video is None or audio is None:
+        return None
+    return audio - video
+
+def verify_smart_output(output_video, expected, frame_duration, num_pieces):
+    """
+    校验智能渲染结果：视频流能完整解码且没有报错，时长与保留段总长一致
+    （多复制 GOP 或拼接处参数集不兼容都会在这里暴露）
+
+    Returns:
+        (是否通过, 说明)
+    """
+    cmd = ['ffmpeg', '-v', 'error', '-i', output_video, '-map', '0:v', '-f', 'null', '-']
+    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    errors = result.stderr.strip()
+    if result.returncode != 0 or errors:
+        return False, f"解码出错: {errors.splitlines()[0] if errors else result.returncode}"
+
+    duration = probe_stream_duration(output_video, 'v:0')
+    # 每个片段最多有一帧的取整误差
+    tolerance = max(0.25, frame_duration * num_pieces / 2)
+    if duration is None or abs(duration - expected) > tolerance:
+        return False, f"视频时长 {duration} 秒与预期 {expected:.3f} 秒不符"
+    return True, ''
+
+def _clip_smart(input_video, segments, output_video, crf=SMART_CRF):
+    """
+    智能渲染：视频按关键帧拆分为复制段与重编码段后拼接；
+    音频单独按原 Filter 的 atrim 链渲染（音频编码代价很小），最后一次封装
+
+    Returns:
+        False 表示原片不支持智能渲染（调用方应回退到普通引擎）
+    """
+    stream = probe_video_stream(input_video)
+    if not stream or stream.get('codec_name') not in SMART_CODECS:
+        print(f"⚠️ 智能渲染暂不支持该编码（{stream and stream.get('codec_name')}），改用普通剪辑")
+        return False
+    keyframes = probe_keyframes(input_video)
+    if not keyframes:
+        return False
+
+    pieces = plan_smart_render(segments, keyframes)
+    copied = sum(e - s for s, e, mode in pieces if mode == 'copy')
+    total = sum(e - s for s, e, _ in pieces) or 1
+    print(f"   流复制 {copied:.1f}/{total:.1f} 秒（{copied / total:.0%}），重编码 "
+          f"{sum(1 for p in pieces if p[2] == 'encode')} 个边界片段")
+
+    encode_args = _smart_encode_args(stream, crf)
+    frame_duration = _frame_duration(stream)
+    work_dir = tempfile.mkdtemp(prefix='smart_', dir=os.path.dirname(os.path.abspath(output_video)))
+    try:
+        list_file = os.path.join(work_dir, "pieces.txt")
+        with open(list_file, 'w', encoding='utf-8') as f:
+            f.write("ffconcat version 1.0\n")
+            for n, (start, end, mode) in enumerate(pieces):
+                piece = os.path.join(work_dir, f"piece_{n:05d}.ts")
+                _render_piece(input_video, start, end, mode, piece, encode_args, frame_duration / 2)
+                f.write(f"file '{os.path.basename(piece)}'\n")
+                print(f"   片段 {n + 1}/{len(pieces)} 完成", end='\r')
+        print()
+
+        audio_script = os.path.join(work_dir, "audio.txt")
+        with open(audio_script, 'w', encoding='utf-8') as f:
+            inputs = ''.join(_CHAIN_LABEL.search(seg['a']).group(0) for seg in segments)
+            f.write(';'.join(seg['a'].replace('[0:a]', '[1:a]', 1) for seg in segments))
+            f.write(f";{inputs}concat=n={len(segments)}:v=0:a=1[outa]")
+
+        cmd = [
+            'ffmpeg', '-y',
+            '-f', 'concat', '-safe', '0', '-i', list_file,
+            '-i', input_video,
+            '-filter_complex_script', audio_script,
+            '-map', '0:v', '-map', '[outa]',
+            '-c:v', 'copy',
+            output_video
+        ]
+        ffmpeg_runner.run_ffmpeg(cmd, total, label='封装')
+
+        ok, reason = verify_smart_output(output_video, total, frame_duration, len(pieces))
+        if not ok:
+            print(f"⚠️ 智能渲染结果校验失败（{reason}），改用普通剪辑")
+            os.remove(output_video)
+            return False
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# ===== 多版本输出：一次解码 + 剪辑，split 到各格式/清晰度与音频 =====
+FORMAT_CODECS = {
+    'mp4': {'video': ['-c:v', 'libx264', '-pix_fmt', 'yuv420p'], 'audio': ['-c:a', 'aac'],
+            'extra': ['-movflags', '+faststart']},
+    # 恒定质量模式；清晰度配置了 video_bitrate 时追加的 -b:v 作为码率上限
+    'webm': {'video': ['-c:v', 'libvpx-vp9', '-row-mt', '1', '-deadline', 'good', '-cpu-used', '4',
+                       '-crf', '31', '-b:v', '0'],
+             'audio': ['-c:a', 'libopus'], 'extra': []},
+}
+AUDIO_CODECS = {
+    'mp3': ['-c:a', 'libmp3lame', '-q:a', '2'],
+    'wav': ['-c:a', 'pcm_s16le'],
+    'aac': ['-c:a', 'aac', '-b:a', '192k'],
+}
+
+def plan_renditions(output_video, output_config):
+    """
+    按 output.formats × output.renditions 生成各版本的输出路径与参数
+
+    未配置 renditions 时每个格式输出一个默认版本（原分辨率、编码器默认码率）。
+    第一个版本（格式一致时）使用 output_video 本身的路径，其余版本在文件名后追加清晰度。
+
+    Returns:
+        (renditions, audio_path)；renditions 为 [{'path', 'format', 'quality', 'video_bitrate',
+        'audio_bitrate', 'resolution'}]（默认版本 quality 为 None），未开启音频提取时 audio_path 为 None
+    """
+    formats = output_config.get('formats') or ['mp4']
+    ladder = output_config.get('quality', {})
+    qualities = output_config.get('renditions') or [None]
+    base = os.path.splitext(output_video)[0]
+
+    renditions = []
+    for fmt in formats:
+        if fmt not in FORMAT_CODECS:
+            print(f"⚠️ 不支持的输出格式，已跳过: {fmt}")
+            continue
+        for quality in qualities:
+            if quality is not None and quality not in ladder:
+                print(f"⚠️ 未定义的清晰度，已跳过: {quality}")
+                continue
+            primary = not renditions and output_video.lower().endswith('.' + fmt)
+            if primary:
+                path = output_video
+            elif quality is None:
+                path = f"{base}.{fmt}"
+            else:
+                path = f"{base}_{quality}.{fmt}"
+            params = ladder[quality] if quality is not None else {}
+            renditions.append(dict(params, path=path, format=fmt, quality=quality))
+
+    audio_path = None
+    if output_config.get('extract_audio'):
+        audio_format = output_config.get('audio_format', 'mp3')
+        audio_path = f"{base}.{audio_format}"
+    return renditions, audio_path
+
+def derivable_renditions(renditions, output_video):
+    """
+    只有一个默认清晰度且第一个版本就是 output_video 时，返回其余版本：
+    主输出交给 clip_video（可用 concat / 智能渲染 / 并行等引擎），其余格式由剪辑结果转码得到。
+    配置了清晰度（需要缩放或限定码率）时返回 None，走 render_renditions 一次解码输出全部版本。
+    """
+    if not renditions or renditions[0]['path'] != output_video:
+        return None
+    if any(r['quality'] is not None for r in renditions):
+        return None
+    return renditions[1:]
+
+def derive_renditions(source_video, renditions, audio_path=None):
+    """由已剪辑好的成片转码出其余格式与音频（同一个 ffmpeg 进程，只解码一次）"""
+    if not renditions and not audio_path:
+        return True
+
+    cmd = ['ffmpeg', '-y', '-i', source_video]
+    for r in renditions:
+        codecs = FORMAT_CODECS[r['format']]
+        cmd += ['-map', '0:v:0', '-map', '0:a:0?'] + codecs['video'] + codecs['audio'] + codecs['extra'] + [r['path']]
+    if audio_path:
+        audio_format = os.path.splitext(audio_path)[1].lstrip('.')
+        cmd += ['-map', '0:a:0', '-vn'] + AUDIO_CODECS.get(audio_format, []) + [audio_path]
+
+    outputs = [r['path'] for r in renditions] + ([audio_path] if audio_path else [])
+    print(f"🔁 由成片转码其余版本: {', '.join(outputs)}")
+    t0 = time.time()
+    try:
+        ffmpeg_runner.run_ffmpeg(cmd, probe_stream_duration(source_video) or 0, label='转码其余版本')
+        print(f"✅ 转码完成（{time.time() - t0:.1f} 秒）")
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"❌ 转码失败: {e}")
+        return False
+
+def _scale_filter(resolution):
+    """'1280:-1' → scale=1280:-2（保证偶数高度），'original' 不缩放"""
+    if not resolution or resolution == 'original':
+        return 'null'
+    width, _, height = str(resolution).partition(':')
+    width = '-2' if width == '-1' else width
+    height = '-2' if height in ('', '-1') else height
+    return f"scale={width}:{height}"
+
+def render_renditions(input_video, filter_file, renditions, audio_path=None, subtitle_path=None):
+    """
+    一次解码、一次剪辑，split/asplit 后在同一个 ffmpeg 进程里编码全部版本与音频
+    """
+    if not os.path.exists(filter_file):
+        print(f"❌ Filter 文件不存在: {filter_file}")
+        return False
+
+    video_label = '[outv]'
+    if subtitle_path:
+        filter_file, video_label = add_subtitle_overlay(
+            filter_file, subtitle_path, filter_file + '.sub.txt'
+        )
+        print(f"🔥 同时烧录字幕: {subtitle_path}")
+
+    with open(filter_file, 'r', encoding='utf-8') as f:
+        graph = f.read().strip().rstrip(';')
+
+    n = len(renditions)
+    audio_outputs = n + (1 if audio_path else 0)
+    if n:
+        graph += f";{video_label}split={n}" + ''.join(f"[sv{i}]" for i in range(n))
+    else:
+        # 只提取音频
+        graph += f";{video_label}nullsink"
+    graph += f";[outa]asplit={audio_outputs}" + ''.join(f"[ra{i}]" for i in range(audio_outputs))
+    for i, r in enumerate(renditions):
+        graph += f";[sv{i}]{_scale_filter(r.get('resolution'))}[rv{i}]"
+
+    script = filter_file + '.renditions.txt'
+    with open(script, 'w', encoding='utf-8') as f:
+        f.write(graph)
+
+    cmd = ['ffmpeg', '-y', '-i', input_video, '-filter_complex_script', script]
+    for i, r in enumerate(renditions):
+        codecs = FORMAT_CODECS[r['format']]
+        cmd += ['-map', f"[rv{i}]", '-map', f"[ra{i}]"] + codecs['video']
+        if r.get('video_bitrate'):
+            cmd += ['-b:v', str(r['video_bitrate'])]
+        cmd += codecs['audio']
+        if r.get('audio_bitrate'):
+            cmd += ['-b:a', str(r['audio_bitrate'])]
+        cmd += codecs['extra'] + [r['path']]
+    if audio_path:
+        audio_format = os.path.splitext(audio_path)[1].lstrip('.')
+        cmd += ['-map', f"[ra{n}]", '-vn'] + AUDIO_CODECS.get(audio_format, []) + [audio_path]
+
+    outputs = [f"{r['format']}/{r['quality'] or '默认'}" for r in renditions] + ([audio_path] if audio_path else [])
+    print(f"✂️ 开始剪辑: {input_video}（一次解码输出 {len(outputs)} 个版本: {', '.join(outputs)}）")
+    t0 = time.time()
+    try:
+        ffmpeg_runner.run_ffmpeg(cmd, kept_duration(parse_filter_script(filter_file)), label='多版本输出')
+        print(f"✅ 剪辑完成（{time.time() - t0:.1f} 秒）")
+        for r in renditions:
+            print(f"   {r['format']}/{r['quality'] or '默认'}: {r['path']}")
+        if audio_path:
+            print(f"   音频: {audio_path}")
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"❌ 剪辑失败: {e}")
+        return False
+
+def clip_video(input_video, filter_file, output_video, subtitle_path=None,
+               engine='auto', concat_threshold=CONCAT_THRESHOLD, group_size=GROUP_SIZE,
+               smart_render=False, smart_crf=SMART_CRF, workers=1, threads=0):
+    if not os.path.exists(filter_file):
+        print(f"❌ Filter 文件不存在: {filter_file}")
+        return False
+
+    segments = parse_filter_script(filter_file)
+    engine = select_engine(len(segments), engine, concat_threshold)
+    if workers > 1 and not smart_render:
+        # 并行编码走 concat 引擎：按时长均分后各块独立编码，再无损拼接
+        engine = 'concat'
+    if smart_render and subtitle_path:
+        # 烧录字幕需要重编码全部画面，流复制没有意义
+        print("⚠️ 烧录字幕时不使用智能渲染")
+        smart_render = False
+    if smart_render:
+        if workers > 1:
+            print(f"⚠️ 智能渲染逐片段串行处理，workers={workers} 不生效")
+        dropped = sorted({name for seg in segments for name in _video_filters(seg['v'])} - {'trim', 'setpts'})
+        if dropped:
+            print(f"⚠️ 智能渲染流复制画面，Filter 中的视频滤镜将被忽略: {', '.join(dropped)}")
+
+    label = 'smart' if smart_render else engine + (f" ×{workers}" if workers > 1 else '')
+    print(f"✂️ 开始剪辑: {input_video}（{len(segments)} 段，{label} 引擎）")
+    t0 = time.time()
+    try:
+        if smart_render and _clip_smart(input_video, segments, output_video, smart_crf):
+            print(f"✅ 剪辑完成: {output_video}")
+            return True
+
+        if engine == 'concat':
+            if subtitle_path:
+                print(f"🔥 同时烧录字幕: {subtitle_path}")
+            _clip_concat(input_video, segments, output_video, subtitle_path, group_size,
+                         workers, threads)
+        else:
+            _clip_filter(input_video, filter_file, output_video, subtitle_path, kept_duration(segments))
+        print(f"✅ 剪辑完成: {output_video}（{time.time() - t0:.1f} 秒）")
+        return True
     except subprocess.CalledProcessError as e:
         print(f"❌ 剪辑失败: {e}")
+        return False
+
+def benchmark_engines(source=None, cut_counts=(10, 100, 1000, 5000), duration=600,
+                      group_size=GROUP_SIZE, timeout=1800):
+    """
+    对比两种剪辑引擎在不同剪辑点数量下的耗时
+
+    不指定 source 时用 lavfi 合成一段测试视频；保留段在全片均匀分布，
+    每个保留段占其间隔的 80%。
+    """
+    work_dir = tempfile.mkdtemp(prefix='clip_bench_')
+    try:
+        if not source:
+            source = os.path.join(work_dir, "source.mp4")
+            print(f"🎬 生成 {duration} 秒测试视频...")
+            subprocess.run([
+                'ffmpeg', '-y',
+                '-f', 'lavfi', '-i', f"testsrc=size=640x360:rate=25:duration={duration}",
+                '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=48000:duration={duration}",
+                '-c:v', 'libx264', '-preset', 'veryfast', '-g', '50',
+                '-c:a', 'aac', '-shortest', source
+            ], check=True, capture_output=True)
+        else:
+            from transcriber import get_duration
+            duration = get_duration(source)
+
+        print(f"\n📊 剪辑引擎对比（{os.path.basename(source)}，{duration:.0f} 秒；括号内为音频减视频时长）")
+        print(f"  {'剪辑点':>6}  {'filter':>20}  {'concat':>20}")
+        for n in cut_counts:
+            step = duration / n
+            keeps = [(round(i * step, 3), round(i * step + step * 0.8, 3)) for i in range(n)]
+            filter_file = os.path.join(work_dir, f"cuts_{n}.txt")
+            write_filter_script(keeps, filter_file)
+
+            timings = {}
+            for engine in ('filter', 'concat'):
+                output = os.path.join(work_dir, f"out_{engine}_{n}.mp4")
+                t0 = time.time()
+                try:
+                    if engine == 'filter':
+                        subprocess.run([
+                            'ffmpeg', '-y', '-i', source,
+                            '-filter_complex_script', filter_file,
+                            '-map', '[outv]', '-map', '[outa]', output
+                        ], check=True, capture_output=True, timeout=timeout)
+                    else:
+                        _clip_concat(source, parse_filter_script(filter_file), output,
+                                     group_size=group_size)
+                    elapsed = time.time() - t0
+                    drift = av_drift(output)
+                    drift_text = f"{drift:+.3f}" if drift is not None else '?'
+                    timings[engine] = f"{elapsed:8.1f}秒 ({drift_text})"
+                except subprocess.TimeoutExpired:
+                    timings[engine] = f"  >{timeout}秒"
+                except subprocess.CalledProcessError:
+                    timings[engine] = "      失败"
+            print(f"  {n:>6}  {timings['filter']:>20}  {timings['concat']:>20}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def benchmark_parallel(source=None, max_workers=None, cuts=100, duration=600,
+                       group_size=GROUP_SIZE, threads=0):
+    """
+    对比单进程 filter 引擎与 1..max_workers 个并行编码进程的耗时与加速比
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    work_dir = tempfile.mkdtemp(prefix='clip_bench_')
+    try:
+        if not source:
+            source = os.path.join(work_dir, "source.mp4")
+            print(f"🎬 生成 {duration} 秒 1080p 测试视频...")
+            subprocess.run([
+                'ffmpeg', '-y',
+                '-f', 'lavfi', '-i', f"testsrc2=size=1920x1080:rate=30:duration={duration}",
+                '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=48000:duration={duration}",
+                '-c:v', 'libx264', '-preset', 'veryfast', '-g', '60',
+                '-c:a', 'aac', '-shortest', source
+            ], check=True, capture_output=True)
+        else:
+            from transcriber import get_duration
+            duration = get_duration(source)
+
+        step = duration / cuts
+        filter_file = os.path.join(work_dir, "cuts.txt")
+        write_filter_script([(round(i * step, 3), round(i * step + step * 0.8, 3)) for i in range(cuts)],
+                            filter_file)
+        segments = parse_filter_script(filter_file)
+
+        workers = [1]
+        while workers[-1] * 2 <= max_workers:
+            workers.append(workers[-1] * 2)
+        if workers[-1] != max_workers:
+            workers.append(max_workers)
+
+        print(f"\n📊 并行编码对比（{os.path.basename(source)}，{duration:.0f} 秒，{cuts} 个剪辑点）")
+        output = os.path.join(work_dir, "out.mp4")
+        t0 = time.time()
+        _clip_filter(source, filter_file, output)
+        baseline = time.time() - t0
+        print(f"  单进程 filter: {baseline:7.1f} 秒")
+        for k in workers:
+            t0 = time.time()
+            _clip_concat(source, segments, output, group_size=group_size, workers=k, threads=threads)
+            wall = time.time() - t0
+            print(f"  {k:>3} 进程:      {wall:7.1f} 秒  加速比 {baseline / wall:.2f}x")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 4:
-        print("Usage: python clipper.py <input_video> <filter_file> <output_video>")
-        sys.exit(1)
-    clip_video(sys.argv[1], sys.argv[2], sys.argv[3])
+    import argparse
+
+    if '--benchmark' in sys.argv:
+        bench = argparse.ArgumentParser()
+        bench.add_argument("--benchmark", action="store_true", help="对比 filter / concat 两种剪辑引擎")
+        bench.add_argument("--source", help="测试用视频（默认用 lavfi 合成）")
+        bench.add_argument("--cuts", type=int, nargs='+', default=[10, 100, 1000, 5000], help="剪辑点数量")
+        bench.add_argument("--duration", type=int, default=600, help="合成视频长度（秒）")
+        bench.add_argument("--group-size", type=int, default=GROUP_SIZE, help="concat 引擎每组保留段数")
+        bench.add_argument("--timeout", type=int, default=1800, help="单次剪辑超时（秒）")
+        bench_args = bench.parse_args()
+        benchmark_engines(bench_args.source, bench_args.cuts, bench_args.duration,
+                          bench_args.group_size, bench_args.timeout)
+        sys.exit(0)
+
+    if '--benchmark-parallel' in sys.argv:
+        bench = argparse.ArgumentParser()
+        bench.add_argument("--benchmark-parallel", type=int, required=True, help="最多测试的并行进程数")
+        bench.add_argument("--source", help="测试用视频（默认用 lavfi 合成 1080p）")
+        bench.add_argument("--cuts", type=int, default=100, help="剪辑点数量")
+        bench.add_argument("--duration", type=int, default=600, help="合成视频长度（秒）")
+        bench.add_argument("--threads", type=int, default=0, help="每个进程的线程数（0=自动）")
+        bench_args = bench.parse_args()
+        benchmark_parallel(bench_args.source, bench_args.benchmark_parallel, bench_args.cuts,
+                           bench_args.duration, threads=bench_args.threads)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_video", help="输入视频")
+    parser.add_argument("filter_file", help="分析器生成的 Filter 文件")
+    parser.add_argument("output_video", help="输出视频")
+    parser.add_argument("--subtitle", help="同时烧录的字幕文件（时间轴需对齐剪辑后视频）")
+    parser.add_argument("--engine", choices=ENGINES, default='auto', help="剪辑引擎")
+    parser.add_argument("--concat-threshold", type=int, default=CONCAT_THRESHOLD,
+                        help="auto 模式下超过该段数改用 concat 引擎")
+    parser.add_argument("--group-size", type=int, default=GROUP_SIZE, help="concat 引擎每组保留段数")
+    parser.add_argument("--smart", action="store_true", help="智能渲染：关键帧之间流复制，只重编码剪辑边界")
+    parser.add_argument("--crf", type=int, default=SMART_CRF, help="智能渲染边界片段的 CRF")
+    parser.add_argument("--workers", type=int, default=1, help="并行编码进程数")
+    parser.add_argument("--threads", type=int, default=0, help="每个进程的线程数（0=按核数均分）")
+    parser.add_argument("--renditions", nargs='+', help="按 config.yaml 的清晰度一次输出多个版本，如 high medium low")
+    parser.add_argument("--config", default="config.yaml", help="配置文件（读取 output 配置）")
+    args = parser.parse_args()
+
+    if args.renditions:
+        import yaml
+        with open(args.config, 'r', encoding='utf-8') as f:
+            output_config = dict((yaml.safe_load(f) or {}).get('output', {}), renditions=args.renditions)
+        renditions, audio_path = plan_renditions(args.output_video, output_config)
+        ok = render_renditions(args.input_video, args.filter_file, renditions, audio_path, args.subtitle)
+        sys.exit(0 if ok else 1)
+
+    ok = clip_video(args.input_video, args.filter_file, args.output_video, args.subtitle,
+                    args.engine, args.concat_threshold, args.group_size, args.smart, args.crf,
+                    args.workers, args.threads)
+    sys.exit(0 if ok else 1)
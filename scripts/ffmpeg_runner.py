@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+FFmpeg 运行器 - 统一执行 ffmpeg 并实时解析 -progress 输出
+提供进度事件回调、控制台进度条（按 progress.style）以及每次运行的吞吐量汇总
+
+汇总按运行上下文收集：每条流水线在 collect() 中运行，批量并发处理时互不混入；
+在线程池中调用 run_ffmpeg 时用 submit() 提交，使工作线程继承当前上下文。
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+# 默认进度样式，可由 configure() 按 config.yaml 的 progress 配置修改
+_default_style = 'bar'
+# 控制台输出锁：并行运行时进度行不互相穿插
+_console_lock = threading.Lock()
+
+STYLES = ('bar', 'simple', 'none')
+
+
+class RunCollector:
+    """一组 ffmpeg 运行汇总（通常对应一条流水线）"""
+
+    def __init__(self):
+        self._runs: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, summary: Dict):
+        with self._lock:
+            self._runs.append(summary)
+
+    def runs(self, clear: bool = False) -> List[Dict]:
+        with self._lock:
+            runs = list(self._runs)
+            if clear:
+                self._runs.clear()
+        return runs
+
+
+# 未进入 collect() 时（如直接运行各脚本）记录到进程级收集器
+_default_collector = RunCollector()
+_collector: contextvars.ContextVar = contextvars.ContextVar('ffmpeg_run_collector', default=None)
+# 当前上下文的控制台样式（并行渲染时改为不刷新单行进度条）
+_style_override: contextvars.ContextVar = contextvars.ContextVar('ffmpeg_console_style', default=None)
+
+
+def _current_collector() -> RunCollector:
+    return _collector.get() or _default_collector
+
+
+@contextmanager
+def collect(collector: RunCollector = None):
+    """在此上下文内（含经 submit 提交的线程）的 ffmpeg 运行只记录到 collector"""
+    collector = collector or RunCollector()
+    token = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector.reset(token)
+
+
+@contextmanager
+def console_style(style: Optional[str]):
+    """在此上下文内未显式指定 style 的运行使用该控制台样式（None 表示不修改）"""
+    token = _style_override.set(style)
+    try:
+        yield
+    finally:
+        _style_override.reset(token)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit，并让工作线程继承当前的收集器与控制台样式"""
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
+
+
+@dataclass
+class ProgressEvent:
+    """一次 -progress 输出块解析后的进度事件"""
+    label: str
+    frame: int = 0
+    fps: float = 0.0
+    out_time: float = 0.0       # 已输出的媒体时长（秒）
+    speed: float = 0.0          # 相对实时的倍速
+    total_size: int = 0         # 已写出字节数
+    bitrate: str = ''
+    percent: Optional[float] = None
+    eta: Optional[float] = None  # 预计剩余时间（秒）
+    elapsed: float = 0.0
+    done: bool = False
+
+
+def configure(config: Dict):
+    """按 config.yaml 的 progress 配置设置默认进度样式"""
+    global _default_style
+    progress = (config or {}).get('progress', {})
+    style = progress.get('style', 'bar') if progress.get('enable', True) else 'none'
+    _default_style = style if style in STYLES else 'bar'
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """媒体时长（秒），获取失败返回 None"""
+    cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+           '-of', 'default=noprint_wrappers=1:nokey=1', path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        return float(result.stdout.strip())
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_time(value: str) -> float:
+    """out_time 形如 00:01:23.456000；N/A 时返回 0"""
+    try:
+        h, m, s = value.split(':')
+        return int(h) * 3600 + int(m) * 60 + float(s)
+    except ValueError:
+        return 0.0
+
+
+def _parse_number(value: str, cast=float):
+    """frame/fps/speed/total_size 等字段，N/A 或缺失时返回 0"""
+    try:
+        return cast(value.rstrip('x'))
+    except (ValueError, AttributeError):
+        return cast(0)
+
+
+def _format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '--:--:--'
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class ConsoleProgress:
+    """控制台进度显示：bar 为单行刷新进度条，simple 为每 10% 打印一行，none 不输出"""
+
+    def __init__(self, style: str = 'bar', width: int = 30):
+        self.style = style
+        self.width = width
+        self._last_decile = -1
+
+    def __call__(self, event: ProgressEvent):
+        if self.style == 'none':
+            return
+
+        pct = event.percent
+        stats = f"{event.fps:5.1f}fps {event.speed:5.2f}x ETA {_format_eta(event.eta)}"
+        with _console_lock:
+            if self.style == 'bar':
+                if pct is not None:
+                    filled = int(self.width * pct / 100)
+                    bar = '█' * filled + '░' * (self.width - filled)
+                    line = f"\r   {event.label} [{bar}] {pct:5.1f}% {stats}"
+                else:
+                    line = f"\r   {event.label} {event.out_time:8.1f}s {stats}"
+                sys.stdout.write(line)
+                if event.done:
+                    sys.stdout.write('\n')
+                sys.stdout.flush()
+            else:
+                decile = int(pct // 10) if pct is not None else -1
+                if event.done or decile > self._last_decile:
+                    self._last_decile = decile
+                    progress = f"{pct:.0f}%" if pct is not None else f"{event.out_time:.1f}s"
+                    print(f"   {event.label} {progress} {stats}")
+
+
+def run_ffmpeg(
+    cmd: List[str],
+    duration: Optional[float] = None,
+    label: str = 'ffmpeg',
+    callback: Optional[Callable[[ProgressEvent], None]] = None,
+    style: Optional[str] = None
+) -> Dict:
+    """
+    运行 ffmpeg，实时解析进度
+
+    Args:
+        cmd: ffmpeg 命令（cmd[0] 为 ffmpeg），会自动插入 -progress pipe:1 -nostats
+        duration: 预期输出时长（秒），用于计算百分比与 ETA；未知时为 None
+        label: 进度显示与汇总中的名称
+        callback: 每个进度事件的回调
+        style: 控制台样式 bar/simple/none，默认用 console_style() 或 configure() 设置的样式
+
+    Returns:
+        本次运行的吞吐量汇总
+
+    Raises:
+        subprocess.CalledProcessError: ffmpeg 返回非零，stderr 为最后若干行日志
+    """
+    full_cmd = [cmd[0], '-progress', 'pipe:1', '-nostats'] + list(cmd[1:])
+    console = ConsoleProgress(style or _style_override.get() or _default_style)
+    stderr_tail = deque(maxlen=40)
+
+    proc = subprocess.Popen(
+        full_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, encoding='utf-8', errors='replace'
+    )
+
+    # stderr 单独线程读取，避免缓冲区写满导致 ffmpeg 阻塞
+    def drain():
+        for line in proc.stderr:
+            stderr_tail.append(line.rstrip())
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+
+    t0 = time.time()
+    event = ProgressEvent(label=label)
+    block: Dict[str, str] = {}
+    for line in proc.stdout:
+        key, _, value = line.strip().partition('=')
+        if key != 'progress':
+            block[key] = value
+            continue
+
+        elapsed = time.time() - t0
+        event = ProgressEvent(
+            label=label,
+            frame=_parse_number(block.get('frame'), int),
+            fps=_parse_number(block.get('fps')),
+            out_time=_parse_time(block.get('out_time', '')),
+            speed=_parse_number(block.get('speed')),
+            total_size=_parse_number(block.get('total_size'), int),
+            bitrate=block.get('bitrate', ''),
+            elapsed=elapsed,
+            done=(value == 'end')
+        )
+        if duration:
+            event.percent = min(100.0, event.out_time / duration * 100)
+            rate = event.out_time / elapsed if elapsed > 0 else 0
+            event.eta = (duration - event.out_time) / rate if rate > 0 else None
+        console(event)
+        if callback:
+            callback(event)
+        block = {}
+
+    returncode = proc.wait()
+    reader.join()
+    wall = time.time() - t0
+
+    if returncode != 0:
+        if console.style == 'bar' and not event.done:
+            print()
+        raise subprocess.CalledProcessError(returncode, full_cmd, stderr='\n'.join(stderr_tail))
+
+    media = event.out_time or (duration or 0)
+    summary = {
+        'label': label,
+        'wall_sec': round(wall, 3),
+        'media_sec': round(media, 3),
+        'speed': round(media / wall, 3) if wall > 0 else 0,
+        'avg_fps': round(event.frame / wall, 2) if wall > 0 else 0,
+        'frames': event.frame,
+        'output_bytes': event.total_size,
+        'finished_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    _current_collector().add(summary)
+    return summary
+
+
+def summaries() -> List[Dict]:
+    """当前上下文（流水线）内所有 ffmpeg 运行的汇总"""
+    return _current_collector().runs()
+
+
+def save_summaries(path: str, clear: bool = True, append: bool = False):
+    """
+    把当前上下文的运行汇总写入 JSON
+
+    Args:
+        path: 输出文件，通常为 stats.json 同目录下的 ffmpeg_runs.json
+        clear: 写出后清空当前收集器中的记录
+        append: 追加到文件中已有的记录之后（默认覆盖，与 stats.json 一样对应最近一次处理）
+    """
+    runs = _current_collector().runs(clear)
+    if not runs and append:
+        return
+    # 本次没有运行 ffmpeg（如全部命中缓存）时也覆盖写出空汇总，避免沿用上一次处理的记录
+
+    existing = []
+    if append and os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                existing = json.load(f).get('runs', [])
+        except (OSError, ValueError):
+            existing = []
+
+    all_runs = existing + runs
+    total_wall = sum(r['wall_sec'] for r in all_runs)
+    total_media = sum(r['media_sec'] for r in all_runs)
+    data = {
+        'total_wall_sec': round(total_wall, 3),
+        'total_media_sec': round(total_media, 3),
+        'overall_speed': round(total_media / total_wall, 3) if total_wall > 0 else 0,
+        'runs': all_runs,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
@@ -9,8 +9,14 @@ import sys
 import json
 import subprocess
 import argparse
+import shutil
+import tempfile
 from pathlib import Path
 from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+
+import ffmpeg_runner
+from cache_store import ArtifactCache
 
 # 设置控制台编码为UTF-8（仅在直接运行时）
 if sys.platform == 'win32' and __name__ == '__main__':
@@ -19,11 +25,102 @@ if sys.platform == 'win32' and __name__ == '__main__':
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
 
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+# 体积预算模式的参数阶梯（宽度, 帧率, 压缩档位），从高画质到低画质
+BUDGET_LADDER = [
+    (480, 15, 0), (480, 12, 1), (400, 12, 1), (400, 10, 2),
+    (320, 12, 1), (320, 10, 2), (320, 8, 3), (240, 10, 2),
+    (240, 8, 3), (200, 8, 3), (160, 8, 3), (160, 6, 3),
+]
+# 各格式在每个压缩档位下的参数：GIF 调色板颜色数 / WebP 质量 / MP4 CRF
+BUDGET_LEVELS = {
+    'gif': [256, 128, 64, 32],
+    'webp': [80, 65, 50, 35],
+    'mp4': [23, 27, 31, 35],
+}
+# 同一画质档位下的格式优先级：GIF 兼容性最好，其次 WebP、MP4
+BUDGET_FORMATS = ('gif', 'webp', 'mp4')
+# 估算值与预算之间保留的余量
+BUDGET_MARGIN = 0.9
+
+
+def detach_output(path: str):
+    """
+    输出文件可能是指向缓存条目的硬链接（ArtifactCache.fetch 用 os.link）：
+    写入前先删除，ffmpeg -y 覆盖时才不会改写缓存中的同一份数据
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def parse_size(text) -> int:
+    """'5MB' / '800KB' / 1048576 → 字节数"""
+    if isinstance(text, (int, float)):
+        return int(text)
+    value = str(text).strip().upper().replace(' ', '')
+    for unit in ('GB', 'MB', 'KB', 'B'):
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * SIZE_UNITS[unit])
+    return int(float(value))
+
+
+def _budget_encode_args(fmt: str, width: int, fps: int, level: int) -> List[str]:
+    """体积预算模式下各输出格式的滤镜与编码参数（静音）"""
+    vf = f"fps={fps},scale={width}:-2:flags=lanczos"
+    value = BUDGET_LEVELS[fmt][level]
+    if fmt == 'gif':
+        return ['-filter_complex',
+                f"[0:v]{vf},split[a][b];[a]palettegen=max_colors={value}:stats_mode=diff[p];"
+                f"[b][p]paletteuse=dither=sierra2_4a:diff_mode=rectangle"]
+    if fmt == 'webp':
+        return ['-vf', vf, '-an', '-c:v', 'libwebp', '-lossless', '0', '-q:v', str(value), '-loop', '0']
+    return ['-vf', vf, '-an', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-crf', str(value),
+            '-preset', 'slow', '-movflags', '+faststart']
+
+
+def plan_gif_batch(
+    jobs: List[Dict],
+    seek_cost: float = 1.5,
+    decode_speed: float = 8.0,
+    max_cluster: int = 8
+) -> List[List[Dict]]:
+    """
+    按代价模型把 GIF 任务合并为若干次解码
+
+    相邻片段之间的间隔如果顺序解码过去（间隔 / 解码倍速）比重新启动一次 ffmpeg
+    并定位（seek_cost）更便宜，就合并到同一个滤镜图里输出；重叠片段总是合并。
+
+    Args:
+        jobs: [{'start', 'end', 'output_path', ...}]
+        seek_cost: 每启动一次 ffmpeg（进程启动 + 定位 + 解码器初始化）的估计开销（秒）
+        decode_speed: 源视频解码速度（倍实时）
+        max_cluster: 单个滤镜图最多输出的 GIF 数
+
+    Returns:
+        按开始时间排序的任务簇列表
+    """
+    clusters: List[List[Dict]] = []
+    cluster_end = None
+    for job in sorted(jobs, key=lambda j: j['start']):
+        gap = job['start'] - cluster_end if cluster_end is not None else None
+        if gap is not None and gap / decode_speed < seek_cost and len(clusters[-1]) < max_cluster:
+            clusters[-1].append(job)
+            cluster_end = max(cluster_end, job['end'])
+        else:
+            clusters.append([job])
+            cluster_end = job['end']
+    return clusters
+
+
 class GifGenerator:
     """GIF 生成器主类"""
 
     def __init__(self, config_path: str = None):
         self.config = self._load_config(config_path)
+        self.cache = ArtifactCache(self.config, 'gifs')
 
     def _load_config(self, config_path: str) -> Dict:
         """加载配置文件"""
@@ -109,7 +206,7 @@ class GifGenerator:
         # 获取 GIF 配置
         gif_config = self.config.get('golden_quotes', {}).get('gif', {})
 
-        generated = []
+        jobs = []
         for i, quote in enumerate(quotes, 1):
             start_sec = quote['start_ms'] / 1000.0
             end_sec = quote['end_ms'] / 1000.0
@@ -132,22 +229,20 @@ class GifGenerator:
             text_preview = quote['text'][:20].replace(' ', '_').replace('/', '_')
             output_name = f"金句{i}_{text_preview}.gif"
             output_path = os.path.join(output_dir, output_name)
+            jobs.append({'start': actual_start, 'end': actual_end, 'output_path': output_path})
 
-            # 生成 GIF
-            try:
-                self._generate_single_gif(
-                    video_path,
-                    actual_start,
-                    actual_end,
-                    output_path,
-                    gif_config
-                )
-                generated.append(output_path)
+        # 批量生成（合并相邻片段 / 并行）
+        errors = self._render_jobs(video_path, jobs, gif_config)
+
+        generated = []
+        for i, (quote, job) in enumerate(zip(quotes, jobs), 1):
+            output_name = os.path.basename(job['output_path'])
+            if errors.get(job['output_path']) is None:
+                generated.append(job['output_path'])
                 print(f"  ✅ [{i}/{len(quotes)}] {output_name}")
                 print(f"     {quote['text'][:40]}{'...' if len(quote['text']) > 40 else ''}")
-
-            except Exception as e:
-                print(f"  ❌ [{i}/{len(quotes)}] 生成失败: {e}")
+            else:
+                print(f"  ❌ [{i}/{len(quotes)}] 生成失败: {errors[job['output_path']]}")
 
         print(f"\n✅ 成功生成 {len(generated)} 个 GIF 至: {output_dir}")
         return generated
@@ -174,26 +269,170 @@ class GifGenerator:
         os.makedirs(output_dir, exist_ok=True)
 
         gif_config = self.config.get('golden_quotes', {}).get('gif', {})
-        generated = []
+        jobs = [
+            {'start': start, 'end': end, 'output_path': os.path.join(output_dir, f"{prefix}_{i}.gif")}
+            for i, (start, end) in enumerate(time_ranges, 1)
+        ]
+        errors = self._render_jobs(video_path, jobs, gif_config)
 
-        for i, (start, end) in enumerate(time_ranges, 1):
-            output_path = os.path.join(output_dir, f"{prefix}_{i}.gif")
-
-            try:
-                self._generate_single_gif(
-                    video_path,
-                    start,
-                    end,
-                    output_path,
-                    gif_config
-                )
+        generated = []
+        for job in jobs:
+            output_path = job['output_path']
+            if errors.get(output_path) is None:
                 generated.append(output_path)
                 print(f"✅ 生成: {output_path}")
+            else:
+                print(f"❌ 生成失败: {errors[output_path]}")
+
+        return generated
+
+    def _render_jobs(self, video_path: str, jobs: List[Dict], config: Dict) -> Dict[str, str]:
+        """
+        批量生成 GIF：按代价模型合并相邻片段，各簇在有界进程池中并行生成
+
+        Args:
+            video_path: 输入视频
+            jobs: [{'start', 'end', 'output_path'}]
+            config: GIF 配置
+
+        Returns:
+            {输出路径: 错误信息}，成功的任务不在其中
+        """
+        errors: Dict[str, str] = {}
+        if config.get('max_bytes'):
+            # 体积预算模式：逐个搜索参数，输出格式可能变为 .webp / .mp4（会更新 job['output_path']）
+            for job in jobs:
+                try:
+                    job['output_path'] = self.generate_within_budget(
+                        video_path, job['start'], job['end'], job['output_path'],
+                        parse_size(config['max_bytes']), config.get('budget_formats', BUDGET_FORMATS), config
+                    )
+                except Exception as e:
+                    errors[job['output_path']] = str(e)
+            return errors
+
+        jobs = self._fetch_cached(video_path, jobs, config)
+        if not jobs:
+            return errors
+
+        if config.get('batch', 'auto') == 'off' or not config.get('single_pass', True):
+            # 逐个生成（两遍模式没有可合并的单次滤镜图）
+            clusters = [[job] for job in jobs]
+            workers = 1
+        else:
+            clusters = plan_gif_batch(
+                jobs,
+                seek_cost=config.get('seek_cost', 1.5),
+                decode_speed=config.get('decode_speed', 8.0),
+                max_cluster=config.get('max_cluster', 8)
+            )
+            workers = max(1, min(config.get('workers', 4), len(clusters)))
+
+        if len(jobs) > 1:
+            print(f"   {len(jobs)} 个 GIF → {len(clusters)} 次解码，{workers} 个并行进程")
 
+        def render(cluster):
+            try:
+                if len(cluster) == 1:
+                    job = cluster[0]
+                    self._generate_single_gif(video_path, job['start'], job['end'], job['output_path'], config)
+                else:
+                    self._generate_gif_cluster(video_path, cluster, config)
             except Exception as e:
-                print(f"❌ 生成失败: {e}")
+                return {job['output_path']: str(e) for job in cluster}
+
+            for job in cluster:
+                if job.get('cache_key'):
+                    self.cache.save(job['cache_key'], job['output_path'], '.gif')
+            return {}
+
+        # 并行时各线程的单行进度条会互相覆盖，改为不输出进度
+        with ffmpeg_runner.console_style('none' if workers > 1 else None):
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [ffmpeg_runner.submit(executor, render, cluster) for cluster in clusters]
+                for future in futures:
+                    errors.update(future.result())
+        return errors
+
+    def _fetch_cached(self, video_path: str, jobs: List[Dict], config: Dict) -> List[Dict]:
+        """
+        先从产物缓存取已生成过的 GIF，返回仍需渲染的任务
 
-        return generated
+        缓存键 = 源视频指纹 + 区间 + 宽度 + 帧率 + 质量（含对应的调色板参数）
+        """
+        if not self.cache.store:
+            return jobs
+
+        quality = config.get('quality', 'medium')
+        pending = []
+        for job in jobs:
+            params = {
+                'start': round(job['start'], 3),
+                'end': round(job['end'], 3),
+                'width': config.get('width', 480),
+                'fps': config.get('fps', 15),
+                'quality': quality,
+                'settings': self.QUALITY_SETTINGS.get(quality, self.QUALITY_SETTINGS['medium']),
+                'single_pass': config.get('single_pass', True),
+            }
+            try:
+                key = self.cache.key(video_path, params)
+            except OSError:
+                pending.append(job)
+                continue
+            if not self.cache.fetch(key, job['output_path'], '.gif'):
+                pending.append(dict(job, cache_key=key))
+
+        if len(pending) < len(jobs):
+            stats = self.cache.stats()
+            print(f"   GIF 缓存命中 {len(jobs) - len(pending)}/{len(jobs)}（累计命中率 {stats['hit_rate']:.0%}）")
+        return pending
+
+    def _generate_gif_cluster(self, video_path: str, cluster: List[Dict], config: Dict):
+        """
+        一次解码输出多个 GIF：缩放后 split 到各输出，每路 trim 出自己的区间，
+        再各自 palettegen/paletteuse
+        """
+        fps = config.get('fps', 15)
+        quality = config.get('quality', 'medium')
+        qs = self.QUALITY_SETTINGS.get(quality, self.QUALITY_SETTINGS['medium'])
+        width = qs['width'] or config.get('width', 480)
+
+        start = min(job['start'] for job in cluster)
+        end = max(job['end'] for job in cluster)
+        n = len(cluster)
+
+        graph = [f"[0:v]fps={fps},scale={width}:-1:flags=lanczos,split={n}" + ''.join(f"[s{k}]" for k in range(n))]
+        for k, job in enumerate(cluster):
+            graph.append(f"[s{k}]trim=start={job['start'] - start:.3f}:end={job['end'] - start:.3f},"
+                         f"setpts=PTS-STARTPTS,split[a{k}][b{k}]")
+            graph.append(f"[a{k}]palettegen={qs['palette']}[p{k}]")
+            graph.append(f"[b{k}][p{k}]paletteuse={qs['use']}[g{k}]")
+
+        cmd = [
+            'ffmpeg', '-y',
+            '-ss', str(start),
+            '-t', str(end - start),
+            '-i', video_path,
+            '-filter_complex', ';'.join(graph),
+        ]
+        for k, job in enumerate(cluster):
+            detach_output(job['output_path'])
+            cmd += ['-map', f"[g{k}]", job['output_path']]
+
+        try:
+            ffmpeg_runner.run_ffmpeg(cmd, end - start, label=f"{n} 个 GIF", style='none')
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"FFmpeg错误: {e.stderr}")
+
+    # 质量设置：调色板颜色数与统计方式
+    # high 每帧单独生成调色板（stats_mode=single + paletteuse new=1），
+    # medium 只统计帧间变化的区域（diff），low 整段共用一个调色板（full）
+    QUALITY_SETTINGS = {
+        'low': {'width': 320, 'palette': 'max_colors=64:stats_mode=full', 'use': 'dither=bayer:bayer_scale=3'},
+        'medium': {'width': None, 'palette': 'max_colors=128:stats_mode=diff', 'use': 'dither=sierra2_4a:diff_mode=rectangle'},
+        'high': {'width': None, 'palette': 'max_colors=256:stats_mode=single', 'use': 'new=1:dither=sierra2_4a'},
+    }
 
     def _generate_single_gif(
         self,
@@ -204,15 +443,53 @@ class GifGenerator:
         config: Dict
     ):
         """
-        生成单个 GIF
+        生成单个 GIF：split/palettegen/paletteuse 在同一个滤镜图中完成，
+        只解码一次，不落临时调色板文件
 
         Args:
             video_path: 输入视频
             start: 开始时间（秒）
             end: 结束时间（秒）
             output_path: 输出路径
-            config: GIF 配置
+            config: GIF 配置（single_pass: false 时使用旧的两遍模式）
         """
+        if not config.get('single_pass', True):
+            return self._generate_two_pass_gif(video_path, start, end, output_path, config)
+
+        fps = config.get('fps', 15)
+        quality = config.get('quality', 'medium')
+        qs = self.QUALITY_SETTINGS.get(quality, self.QUALITY_SETTINGS['medium'])
+        width = qs['width'] or config.get('width', 480)
+
+        graph = (
+            f"[0:v]fps={fps},scale={width}:-1:flags=lanczos,split[a][b];"
+            f"[a]palettegen={qs['palette']}[p];"
+            f"[b][p]paletteuse={qs['use']}"
+        )
+        gif_cmd = [
+            'ffmpeg', '-y',
+            '-ss', str(start),
+            '-t', str(end - start),
+            '-i', video_path,
+            '-filter_complex', graph,
+            output_path
+        ]
+
+        detach_output(output_path)
+        try:
+            ffmpeg_runner.run_ffmpeg(gif_cmd, end - start, label=os.path.basename(output_path))
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"FFmpeg错误: {e.stderr}")
+
+    def _generate_two_pass_gif(
+        self,
+        video_path: str,
+        start: float,
+        end: float,
+        output_path: str,
+        config: Dict
+    ):
+        """旧的两遍模式：先导出调色板 PNG，再解码一遍应用调色板"""
         width = config.get('width', 480)
         fps = config.get('fps', 15)
         quality = config.get('quality', 'medium')
@@ -240,9 +517,10 @@ class GifGenerator:
                 palette_path
             ]
 
-            result = subprocess.run(palette_cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                print(f"    ⚠️  调色板生成警告: {result.stderr[-100:]}")
+            try:
+                ffmpeg_runner.run_ffmpeg(palette_cmd, end - start, label='调色板', style='none')
+            except subprocess.CalledProcessError as e:
+                print(f"    ⚠️  调色板生成警告: {e.stderr[-100:]}")
 
             # 步骤2: 使用调色板生成 GIF
             gif_cmd = [
@@ -256,15 +534,138 @@ class GifGenerator:
                 output_path
             ]
 
-            result = subprocess.run(gif_cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                raise Exception(f"FFmpeg错误: {result.stderr}")
+            detach_output(output_path)
+            try:
+                ffmpeg_runner.run_ffmpeg(gif_cmd, end - start, label=os.path.basename(output_path))
+            except subprocess.CalledProcessError as e:
+                raise Exception(f"FFmpeg错误: {e.stderr}")
 
         finally:
             # 清理临时文件
             if os.path.exists(palette_path):
                 os.remove(palette_path)
 
+    def generate_within_budget(
+        self,
+        video_path: str,
+        start: float,
+        end: float,
+        output_path: str,
+        max_bytes: int,
+        formats=BUDGET_FORMATS,
+        config: Dict = None
+    ) -> str:
+        """
+        在体积上限内生成动图：在短样本上试编码，搜索宽度、帧率与压缩档位
+
+        样本只从源视频解码一次（无损缓存为 FFV1），所有试编码都读取这份缓存；
+        每种格式在参数阶梯上二分查找，试编码次数不超过 max_trials。
+        同一画质档位下优先 GIF，其次 WebP、MP4。
+
+        Args:
+            video_path: 输入视频
+            start: 开始时间（秒）
+            end: 结束时间（秒）
+            output_path: 输出路径（扩展名会按选中的格式替换）
+            max_bytes: 体积上限（字节）
+            formats: 候选格式
+            config: GIF 配置（sample_sec / max_trials / width / fps 作为上限）
+
+        Returns:
+            实际输出路径
+        """
+        config = config or {}
+        if isinstance(formats, str):
+            formats = [formats]
+        unknown = [fmt for fmt in formats or [] if fmt not in BUDGET_LEVELS]
+        formats = [fmt for fmt in formats or [] if fmt in BUDGET_LEVELS]
+        if unknown:
+            print(f"⚠️ 不支持的动图格式，已跳过: {', '.join(map(str, unknown))}")
+        if not formats:
+            raise ValueError(f"没有可用的动图格式（支持 {', '.join(BUDGET_FORMATS)}）")
+
+        duration = end - start
+        sample_sec = min(duration, config.get('sample_sec', 3))
+        max_trials = config.get('max_trials', 12)
+        ladder = [
+            (w, f, lv) for w, f, lv in BUDGET_LADDER
+            if w <= config.get('width', 480) and f <= config.get('fps', 15)
+        ] or BUDGET_LADDER[-1:]
+
+        work_dir = tempfile.mkdtemp(prefix='gif_budget_')
+        try:
+            # 取区间中部的一段作为样本，按阶梯中最大宽度/帧率解码一次并缓存
+            sample_start = start + (duration - sample_sec) / 2
+            sample = os.path.join(work_dir, 'sample.mkv')
+            ffmpeg_runner.run_ffmpeg([
+                'ffmpeg', '-y', '-ss', str(sample_start), '-t', str(sample_sec), '-i', video_path,
+                '-vf', f"fps={ladder[0][1]},scale={ladder[0][0]}:-2:flags=lanczos",
+                '-an', '-c:v', 'ffv1', sample
+            ], sample_sec, label='样本', style='none')
+
+            trials = 0
+            estimates = {}
+
+            def estimate(fmt, idx):
+                nonlocal trials
+                if (fmt, idx) not in estimates:
+                    width, fps, level = ladder[idx]
+                    trial = os.path.join(work_dir, f"trial_{fmt}_{idx}.{fmt}")
+                    ffmpeg_runner.run_ffmpeg(['ffmpeg', '-y', '-i', sample]
+                                             + _budget_encode_args(fmt, width, fps, level) + [trial],
+                                             sample_sec, label='试编码', style='none')
+                    trials += 1
+                    estimates[(fmt, idx)] = os.path.getsize(trial) * duration / sample_sec
+                return estimates[(fmt, idx)]
+
+            # 每种格式二分查找满足预算的最高画质档位
+            best = None
+            budget = max_bytes * BUDGET_MARGIN
+            for fmt in formats:
+                lo, hi = 0, len(ladder) - 1
+                if best is not None:
+                    hi = min(hi, best[1] - 1)  # 只有画质更高才可能胜出
+                found = None
+                while lo <= hi and trials < max_trials:
+                    mid = (lo + hi) // 2
+                    if estimate(fmt, mid) <= budget:
+                        found, hi = mid, mid - 1
+                    else:
+                        lo = mid + 1
+                if found is not None:
+                    best = (fmt, found)
+                if best is not None and best[1] == 0:
+                    break
+
+            if best is None:
+                # 都不满足时用最小档位的最小格式兜底
+                best = (formats[-1], len(ladder) - 1)
+
+            # 正式编码；实际体积超出时向下退一档重试
+            base = os.path.splitext(output_path)[0]
+            fmt, idx = best
+            while True:
+                width, fps, level = ladder[idx]
+                final_path = f"{base}.{fmt}"
+                detach_output(final_path)
+                ffmpeg_runner.run_ffmpeg(
+                    ['ffmpeg', '-y', '-ss', str(start), '-t', str(duration), '-i', video_path]
+                    + _budget_encode_args(fmt, width, fps, level) + [final_path],
+                    duration, label=os.path.basename(final_path)
+                )
+                size = os.path.getsize(final_path)
+                if size <= max_bytes or idx == len(ladder) - 1:
+                    break
+                os.remove(final_path)
+                idx += 1
+
+            status = '✅' if size <= max_bytes else '⚠️'
+            print(f"    {status} {fmt} {width}px {fps}fps 档位{level}: {size / 1024:.0f}KB "
+                  f"/ 预算 {max_bytes / 1024:.0f}KB（试编码 {trials} 次）")
+            return final_path
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
     def generate_highlights_gif(
         self,
         video_path: str,
@@ -325,10 +726,17 @@ def main():
     parser.add_argument("--max", type=int, help="最多生成 N 个 GIF", default=None)
     parser.add_argument("--config", help="配置文件路径", default="config.yaml")
     parser.add_argument("--prefix", help="文件名前缀 (用于 --time 模式)", default="clip")
+    parser.add_argument("--max-bytes", help="体积上限，如 5MB / 800KB（自动搜索参数与格式）")
+    parser.add_argument("--formats", nargs='+', choices=BUDGET_FORMATS, help="体积预算模式的候选格式")
 
     args = parser.parse_args()
 
     generator = GifGenerator(args.config)
+    gif_config = generator.config['golden_quotes']['gif']
+    if args.max_bytes:
+        gif_config['max_bytes'] = args.max_bytes
+    if args.formats:
+        gif_config['budget_formats'] = args.formats
 
     if args.quotes:
         # 从金句文件生成
@@ -12,6 +12,9 @@ from typing import List, Dict, Tuple
 from dataclasses import dataclass
 from collections import defaultdict
 
+import text_matcher
+from transcript_store import Transcript, SentenceIndex, is_binary
+
 # 设置控制台编码为UTF-8（仅在直接运行时）
 if sys.platform == 'win32' and __name__ == '__main__':
     import io
@@ -71,16 +74,21 @@ class GoldenQuoteDetector:
         print("🔍 开始检测金句...")
 
         # 加载转录数据
-        with open(transcript_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        segments = data['segments']
-        if not segments:
+        transcript = Transcript.load(transcript_file)
+        if not len(transcript):
             print("❌ 转录数据为空")
             return []
 
-        # 将字符级片段转换为句子级
-        sentences = self._segment_to_sentences(segments)
+        # 将字符级片段转换为句子级（二进制转录中已有句子表时直接复用）
+        write_back = transcript.sentences is None and is_binary(transcript_file)
+        if write_back:
+            # 写回前必须释放内存映射：分句会读取 starts/ends，
+            # 若仍是映射视图则映射无法关闭，Windows 下替换文件会失败
+            transcript.close()
+        sentences = self._segment_to_sentences(transcript)
+        if write_back:
+            # 句子表写回转录文件，下次运行无需重新分句
+            transcript.save(transcript_file)
 
         # 应用所有规则
         self.quotes = []
@@ -108,82 +116,51 @@ class GoldenQuoteDetector:
 
         # 输出结果
         if output_file:
-            self._save_quotes(output_file, data.get('video_path', ''))
+            self._save_quotes(output_file, transcript.video_path)
 
         self._print_summary()
         return self.quotes
 
-    def _segment_to_sentences(self, segments: List[Dict]) -> List[Dict]:
-        """将字符级片段转换为句子级"""
-        sentences = []
-        current_sentence = []
-        current_start = None
-
-        for i, seg in enumerate(segments):
-            if not current_sentence:
-                current_start = seg['start']
-
-            current_sentence.append(seg['char'])
-
-            # 句子结束标记：。！？……\n
-            if seg['char'] in ['。', '！', '？', '…', '…', '\n']:
-                text = ''.join(current_sentence).strip()
-                if text:
-                    sentences.append({
-                        'text': text,
-                        'start': current_start,
-                        'end': seg['end']
-                    })
-                current_sentence = []
-                current_start = None
-
-            # 处理标点后的停顿（超过 500ms 认为是新句子）
-            elif i < len(segments) - 1:
-                gap = segments[i + 1]['start'] - seg['end']
-                if gap > 500 and current_sentence:
-                    text = ''.join(current_sentence).strip()
-                    if text:
-                        sentences.append({
-                            'text': text,
-                            'start': current_start,
-                            'end': seg['end']
-                        })
-                    current_sentence = []
-                    current_start = None
-
-        # 处理最后剩余的内容
-        if current_sentence:
-            text = ''.join(current_sentence).strip()
-            if text:
-                sentences.append({
-                    'text': text,
-                    'start': current_start,
-                    'end': segments[-1]['end']
-                })
-
-        return sentences
+    def _segment_to_sentences(self, transcript: Transcript) -> List[Dict]:
+        """将字符级片段转换为句子级（句子表由 SentenceIndex 计算并缓存）"""
+        self.index = SentenceIndex(transcript)
+        return self.index.sentences()
 
     def _detect_by_keywords(self, sentences: List[Dict], keywords: List[str]):
         """基于关键词检测"""
         print(f"  📌 关键词规则: {len(keywords)} 个关键词")
 
-        for sent in sentences:
+        # 全部关键词编译成一个自动机，整篇转录只扫描一次，匹配按 token 下标映射到句子
+        matcher = text_matcher.get_matcher(keywords)
+        rank = {k: i for i, k in enumerate(matcher.patterns)}
+
+        # 每句各关键词的出现次数（同一关键词不重叠计数，与 str.count 一致）
+        counts = defaultdict(lambda: defaultdict(int))
+        next_free = {}
+        for first, last, p in text_matcher.match_tokens(self.index.transcript, matcher,
+                                                        whole_tokens=False, overlapping=True):
+            k = self.index.sentence_of(first, last)
+            if k < 0 or first < next_free.get((k, p), 0):
+                continue
+            counts[k][p] += 1
+            next_free[(k, p)] = last
+
+        for k in sorted(counts):
+            sent = sentences[k]
             text = sent['text']
-            for keyword in keywords:
-                if keyword in text:
-                    # 计算分数：关键词出现次数 + 句子长度
-                    count = text.count(keyword)
-                    score = 10 * count + min(len(text) / 10, 10)
-
-                    self.quotes.append(Quote(
-                        text=text,
-                        start_ms=sent['start'],
-                        end_ms=sent['end'],
-                        score=score,
-                        reason=f"包含关键词「{keyword}」",
-                        timestamp=self._format_timestamp(sent['start'])
-                    ))
-                    break  # 一个句子只记录一次
+            # 一个句子只记录一次：取列表中最靠前的关键词
+            keyword = min(counts[k], key=rank.__getitem__)
+            # 计算分数：关键词出现次数 + 句子长度
+            score = 10 * counts[k][keyword] + min(len(text) / 10, 10)
+
+            self.quotes.append(Quote(
+                text=text,
+                start_ms=sent['start'],
+                end_ms=sent['end'],
+                score=score,
+                reason=f"包含关键词「{keyword}」",
+                timestamp=self._format_timestamp(sent['start'])
+            ))
 
     def _detect_by_patterns(self, sentences: List[Dict], patterns: List[str]):
         """基于正则模式检测"""
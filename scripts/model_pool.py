@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+模型池 - 进程级共享的 ASR 模型注册表
+按 (类型, 参数) 键缓存模型实例，引用计数管理生命周期，
+支持显式预热 (warm_up) 与驱逐 (evict)，供流水线与批量处理复用
+"""
+
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+
+def load_funasr(model: str = "paraformer-zh", vad_model: str = "fsmn-vad",
+                punc_model: str = "ct-punc"):
+    """加载 FunASR AutoModel"""
+    from funasr import AutoModel
+
+    return AutoModel(
+        model=model,
+        vad_model=vad_model,
+        punc_model=punc_model,
+        disable_update=True
+    )
+
+
+def load_funasr_batch(model: str = "paraformer-zh", punc_model: str = "ct-punc"):
+    """加载不挂 VAD 的 FunASR 链路（输入已由能量 VAD 切好，可真正批量推理）"""
+    from asr_backends import BatchedFunASR
+
+    return BatchedFunASR(model=model, punc_model=punc_model)
+
+
+def load_whisper(model_size: str = "medium"):
+    """加载 Whisper 模型（有 GPU 时使用 CUDA）"""
+    import whisper
+    import torch
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    return whisper.load_model(model_size, device=device)
+
+
+def load_funasr_onnx(quantize: bool = True, threads: int = 4):
+    """加载 ONNX Runtime 版 FunASR 链路（CPU，可选 int8 量化）"""
+    from asr_backends import OnnxFunASR
+
+    return OnnxFunASR(quantize=quantize, threads=threads)
+
+
+# 模型类型 -> 加载函数
+LOADERS: Dict[str, Callable] = {
+    'funasr': load_funasr,
+    'funasr_batch': load_funasr_batch,
+    'funasr_onnx': load_funasr_onnx,
+    'whisper': load_whisper,
+}
+
+
+class _Entry:
+    """池内单个模型条目"""
+
+    def __init__(self):
+        self.model = None
+        self.refs = 0          # 正在使用的引用数
+        self.pinned = False    # 预热后常驻，直到显式驱逐
+        self.load_lock = threading.Lock()
+        # 推理锁：同一实例的 generate/transcribe 调用串行执行
+        self.infer_lock = threading.RLock()
+
+
+class SerializedModel:
+    """
+    模型代理：对同一模型实例的方法调用加锁串行执行
+
+    AutoModel.generate 在调用过程中会修改实例上共享的 kwargs，Whisper 同理不保证线程安全；
+    批量处理的多个线程共用池内同一实例时，推理必须逐个进行（解码、分析等其余步骤仍并行）。
+    """
+
+    def __init__(self, model, lock):
+        self._model = model
+        self._lock = lock
+
+    def __getattr__(self, name):
+        attr = getattr(self._model, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return call
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            return self._model(*args, **kwargs)
+
+    def unwrap(self):
+        """底层模型实例（调用方自行保证串行）"""
+        return self._model
+
+
+class ModelPool:
+    """线程安全、带引用计数的模型池"""
+
+    def __init__(self):
+        self._entries: Dict[tuple, _Entry] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+
+    @staticmethod
+    def _key(kind: str, params: Dict) -> tuple:
+        return (kind, tuple(sorted(params.items())))
+
+    def _load(self, key: tuple, entry: _Entry):
+        """加载模型（同一键只加载一次，不同键可并行加载）"""
+        with entry.load_lock:
+            if entry.model is None:
+                kind, params = key
+                if kind not in LOADERS:
+                    raise KeyError(f"未知的模型类型: {kind}")
+                print(f"⏳ 加载模型: {kind} {dict(params) or ''}")
+                entry.model = LOADERS[kind](**dict(params))
+                with self._lock:
+                    self.loads += 1
+            else:
+                with self._lock:
+                    self.hits += 1
+        return SerializedModel(entry.model, entry.infer_lock)
+
+    def acquire(self, kind: str, **params):
+        """获取模型（推理调用已串行化的代理）并增加引用计数，用完须调用 release"""
+        key = self._key(kind, params)
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+            entry.refs += 1
+
+        try:
+            return self._load(key, entry)
+        except Exception:
+            self.release(kind, **params)
+            raise
+
+    def release(self, kind: str, **params):
+        """释放引用；未预热的模型在引用归零时立即卸载"""
+        key = self._key(kind, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refs = max(0, entry.refs - 1)
+            if entry.refs == 0 and not entry.pinned:
+                del self._entries[key]
+
+    @contextmanager
+    def lease(self, kind: str, **params):
+        """with 语句形式的 acquire/release"""
+        model = self.acquire(kind, **params)
+        try:
+            yield model
+        finally:
+            self.release(kind, **params)
+
+    def warm_up(self, kind: str, **params):
+        """预先加载模型并常驻池中"""
+        key = self._key(kind, params)
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+            entry.pinned = True
+
+        try:
+            return self._load(key, entry)
+        except Exception:
+            self.evict(kind, **params)
+            raise
+
+    def evict(self, kind: str = None, **params) -> int:
+        """
+        驱逐模型
+
+        Args:
+            kind: 模型类型；为空时驱逐全部空闲模型
+
+        Returns:
+            被卸载的模型数量（仍被引用的模型只取消常驻，待释放时卸载）
+        """
+        evicted = 0
+        with self._lock:
+            if kind is None:
+                keys = list(self._entries)
+            else:
+                keys = [self._key(kind, params)]
+
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                entry.pinned = False
+                if entry.refs == 0:
+                    del self._entries[key]
+                    evicted += 1
+
+        return evicted
+
+    def stats(self) -> Dict:
+        """池状态：已加载模型、引用数及加载/命中次数"""
+        with self._lock:
+            return {
+                'models': {
+                    f"{kind}{dict(params) or ''}": {'refs': e.refs, 'pinned': e.pinned}
+                    for (kind, params), e in self._entries.items()
+                },
+                'loads': self.loads,
+                'hits': self.hits,
+            }
+
+
+# 进程级默认模型池（通过 import model_pool 共享同一实例）
+default_pool = ModelPool()
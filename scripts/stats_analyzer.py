@@ -12,6 +12,9 @@ from pathlib import Path
 from typing import Dict, List
 from collections import Counter
 
+import text_matcher
+from transcript_store import Transcript
+
 # 设置控制台编码为UTF-8（仅在直接运行时）
 if sys.platform == 'win32' and __name__ == '__main__':
     import io
@@ -19,6 +22,10 @@ if sys.platform == 'win32' and __name__ == '__main__':
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
 
+# config.yaml 缺少 filler_words 时的默认语气词
+FILLER_WORDS = ['嗯', '啊', '哎', '诶', '呃', '额', '唉', '哦', '噢', '呀', '欸', '那个', '然后', '就是']
+
+
 class StatsAnalyzer:
     """统计分析器"""
 
@@ -95,14 +102,12 @@ class StatsAnalyzer:
 
     def _analyze_transcript(self, transcript_file: str):
         """分析转录文件"""
-        with open(transcript_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        segments = data['segments']
-        duration_sec = data['duration_ms'] / 1000.0
+        transcript = Transcript.load(transcript_file)
+        chars, starts, ends = transcript.tokens, transcript.starts, transcript.ends
+        duration_sec = transcript.duration_ms / 1000.0
 
         # 文本统计
-        full_text = ''.join([s['char'] for s in segments])
+        full_text = transcript.text
         self.stats['total_chars'] = len(full_text)
         self.stats['total_words'] = len(full_text.replace('，', ' ').replace('。', ' ').split())
 
@@ -112,8 +117,8 @@ class StatsAnalyzer:
 
         # 停顿分析
         pauses = []
-        for i in range(len(segments) - 1):
-            gap = segments[i + 1]['start'] - segments[i]['end']
+        for i in range(len(transcript) - 1):
+            gap = starts[i + 1] - ends[i]
             if gap > 300:  # 超过 300ms 认为是停顿
                 pauses.append(gap / 1000.0)  # 转换为秒
 
@@ -123,12 +128,12 @@ class StatsAnalyzer:
         self.stats['max_pause_duration'] = max(pauses) if pauses else 0
 
         # 字符频率
-        char_freq = Counter([s['char'] for s in segments if s['char'].strip()])
+        char_freq = Counter([c for c in chars if c.strip()])
         self.stats['top_chars'] = char_freq.most_common(10)
 
-        # 填充词检测
-        filler_words = ['嗯', '啊', '哎', '诶', '呃', '额', '唉', '哦', '噢', '呀', '欸', '那个', '然后', '就是']
-        filler_count = sum([full_text.count(fw) for fw in filler_words])
+        # 填充词检测：与分析器共用 config.yaml 的语气词自动机，全文扫描一次（计数语义同 str.count）
+        matcher = text_matcher.config_matcher('filler_words', default=FILLER_WORDS)
+        filler_count = sum(matcher.counts(full_text).values())
         self.stats['filler_ratio'] = (filler_count / self.stats['total_chars'] * 100) if self.stats['total_chars'] > 0 else 0
 
     def _analyze_quotes(self, quotes_file: str):
@@ -1,9 +1,12 @@
-import os
+import sys
 import subprocess
 import argparse
-import shutil
-import whisper
-import torch
+from bisect import bisect_right
+
+import model_pool
+import ffmpeg_runner
+from clipper import subtitle_filter
+from transcript_store import Transcript
 
 # 设置控制台编码为UTF-8（仅在直接运行时）
 if sys.platform == 'win32' and __name__ == '__main__':
@@ -18,51 +21,176 @@ def format_timestamp(seconds):
     ms = int((seconds * 1000) % 1000)
     return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
 
-def generate_srt(video_path, srt_path, model_size="medium"):
+# 断句用标点：句末标点处必断；分句标点处在行长过半时断
+SENTENCE_END = set('。！？!?…')
+CLAUSE_END = set('，、；：,;:')
+# 行尾不显示的标点
+TRAILING_PUNCT = '，。、；：,.;:'
+
+def format_vtt_timestamp(seconds):
+    return format_timestamp(seconds).replace(',', '.')
+
+def remap_to_cut(transcript, keeps):
+    """
+    把转录映射到剪辑后的时间轴
+
+    Args:
+        keeps: 保留段 [(开始秒, 结束秒), ...]，与分析器输出一致
+
+    Returns:
+        (tokens, starts, ends)，中点落在删除区间内的 token 被丢弃，时间单位毫秒
+    """
+    keeps_ms = [(s * 1000, e * 1000) for s, e in keeps]
+    keep_starts = [s for s, _ in keeps_ms]
+    shifts = []
+    elapsed = 0
+    for s, e in keeps_ms:
+        shifts.append(s - elapsed)
+        elapsed += e - s
+
+    tokens, starts, ends = [], [], []
+    src_tokens, src_starts, src_ends = transcript.tokens, transcript.starts, transcript.ends
+    for i in range(len(transcript)):
+        mid = (src_starts[i] + src_ends[i]) / 2
+        k = bisect_right(keep_starts, mid) - 1
+        if k < 0 or mid >= keeps_ms[k][1]:
+            continue
+        s, e = keeps_ms[k]
+        tokens.append(src_tokens[i])
+        starts.append(max(src_starts[i], s) - shifts[k])
+        ends.append(min(src_ends[i], e) - shifts[k])
+    return tokens, starts, ends
+
+def build_cues(tokens, starts, ends, max_chars=16, max_duration=5.0, max_gap_ms=800):
+    """
+    由 token 级时间戳生成字幕条
+
+    规则：句末标点处断开；分句标点处在行长超过一半时断开；
+    达到 max_chars 字或 max_duration 秒、或 token 间停顿超过 max_gap_ms 时强制断开。
+
+    Returns:
+        [(开始毫秒, 结束毫秒, 文本), ...]
+    """
+    cues = []
+    line, line_start, line_end = '', None, None
+    max_duration_ms = max_duration * 1000
+
+    def flush():
+        nonlocal line, line_start
+        text = line.strip().rstrip(TRAILING_PUNCT)
+        if text:
+            cues.append((line_start, line_end, text))
+        line, line_start = '', None
+
+    for i, token in enumerate(tokens):
+        if line_start is not None and (
+            starts[i] - line_end > max_gap_ms
+            or ends[i] - line_start > max_duration_ms
+            or len(line) + len(token) > max_chars
+        ):
+            # 标点不单独成行，挂到上一行末尾
+            if token in SENTENCE_END or token in CLAUSE_END:
+                line += token
+                flush()
+                continue
+            flush()
+
+        if line_start is None:
+            if token.strip() == '' or token in SENTENCE_END or token in CLAUSE_END:
+                continue
+            line_start = starts[i]
+        line += token
+        line_end = ends[i]
+
+        if token in SENTENCE_END or (token in CLAUSE_END and len(line) * 2 >= max_chars):
+            flush()
+
+    if line_start is not None:
+        flush()
+    return cues
+
+def write_cues(cues, path, subtitle_format=None):
+    """写出 SRT 或 WebVTT；未指定 subtitle_format（srt / vtt）时按扩展名判断"""
+    if subtitle_format:
+        vtt = subtitle_format.lower() == 'vtt'
+    else:
+        vtt = path.lower().endswith('.vtt')
+    fmt = format_vtt_timestamp if vtt else format_timestamp
+    with open(path, 'w', encoding='utf-8') as f:
+        if vtt:
+            f.write("WEBVTT\n\n")
+        for i, (start, end, text) in enumerate(cues):
+            if not vtt:
+                f.write(f"{i+1}\n")
+            f.write(f"{fmt(start / 1000)} --> {fmt(end / 1000)}\n{text}\n\n")
+
+def generate_from_transcript(transcript_path, subtitle_path, keeps=None, max_chars=16, max_duration=5.0):
+    """
+    直接由转录文件生成字幕（不再跑一遍 Whisper）
+
+    Args:
+        transcript_path: 转录文件（JSON 或 .vct）
+        subtitle_path: 输出路径，.vtt 写 WebVTT，其余写 SRT
+        keeps: 分析器的保留段；提供时字幕对齐剪辑后的视频
+    """
+    print("📝 由转录生成字幕...")
+    transcript = Transcript.load(transcript_path)
+
+    if keeps:
+        tokens, starts, ends = remap_to_cut(transcript, keeps)
+    else:
+        tokens, starts, ends = transcript.tokens, transcript.starts, transcript.ends
+
+    cues = build_cues(tokens, starts, ends, max_chars, max_duration)
+    write_cues(cues, subtitle_path)
+
+    print(f"✅ 字幕生成完成: {subtitle_path} ({len(cues)} 条)")
+    return True
+
+def generate_srt(video_path, srt_path, model_size="medium", pool=None, subtitle_format=None):
+    """用 Whisper 重新转录生成字幕；subtitle_format（srt / vtt）默认按扩展名判断"""
     print(f"🎙️ 开始生成字幕 (Model: {model_size})...")
+    pool = pool or model_pool.default_pool
     
     try:
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        model = whisper.load_model(model_size, device=device)
+        model = pool.acquire('whisper', model_size=model_size)
     except Exception as e:
         print(f"❌ 模型加载失败: {e}")
         return False
         
     prompt = "简体中文。按摩，SPA，推油，技师，放松，身心。"
-    result = model.transcribe(video_path, language="zh", initial_prompt=prompt, fp16=False)
+    try:
+        result = model.transcribe(video_path, language="zh", initial_prompt=prompt, fp16=False)
+    finally:
+        pool.release('whisper', model_size=model_size)
     
-    with open(srt_path, 'w', encoding='utf-8') as f:
-        for i, segment in enumerate(result["segments"]):
-            start = format_timestamp(segment["start"])
-            end = format_timestamp(segment["end"])
-            text = segment["text"].strip()
-            f.write(f"{i+1}\n{start} --> {end}\n{text}\n\n")
-            
-    print(f"✅ SRT 生成完成: {srt_path}")
+    cues = [(segment["start"] * 1000, segment["end"] * 1000, segment["text"].strip())
+            for segment in result["segments"]]
+    write_cues(cues, srt_path, subtitle_format)
+
+    print(f"✅ 字幕生成完成: {srt_path}")
     return True
 
 def burn_subtitle(video_path, srt_path, output_path):
+    """
+    对已剪辑好的视频单独烧录字幕（会再完整编码一次）
+    流水线中优先使用 clipper.clip_video(subtitle_path=...) 在剪辑时一并烧录
+    """
     print("🔥 正在烧录字幕...")
-    
-    temp_srt = "temp_sub_burn.srt"
-    shutil.copy2(srt_path, temp_srt)
-    
+
     cmd = [
         'ffmpeg', '-y',
         '-i', video_path,
-        '-vf', f"subtitles={temp_srt}",
+        '-vf', subtitle_filter(srt_path),
         '-c:a', 'copy',
         output_path
     ]
     
     try:
-        subprocess.run(cmd, check=True)
+        ffmpeg_runner.run_ffmpeg(cmd, ffmpeg_runner.probe_duration(video_path), label='烧录字幕')
         print(f"✅ 字幕烧录完成: {output_path}")
     except subprocess.CalledProcessError as e:
         print(f"❌ 烧录失败: {e}")
-    finally:
-        if os.path.exists(temp_srt):
-            os.remove(temp_srt)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -70,9 +198,15 @@ if __name__ == "__main__":
     parser.add_argument("output", help="输出视频")
     parser.add_argument("--srt", help="指定 SRT 输出路径", default="subtitle.srt")
     parser.add_argument("--skip-transcribe", action="store_true", help="跳过转录")
+    parser.add_argument("--transcript", help="由已有转录文件生成字幕（不调用 Whisper）")
+    parser.add_argument("--max-chars", type=int, default=16, help="每条字幕最多字数")
+    parser.add_argument("--max-duration", type=float, default=5.0, help="每条字幕最长秒数")
     args = parser.parse_args()
     
-    if not args.skip_transcribe:
+    if args.transcript:
+        generate_from_transcript(args.transcript, args.srt, max_chars=args.max_chars,
+                                 max_duration=args.max_duration)
+    elif not args.skip_transcribe:
         if not generate_srt(args.video, args.srt):
             sys.exit(1)
             
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+多模式文本匹配 - Aho-Corasick 自动机
+一次线性扫描找出全部模式（语气词、金句关键词等）的出现位置，并映射回 token 下标与时间戳
+"""
+
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from transcript_store import Transcript
+
+# config.yaml 中模式列表的缓存：(路径, 修改时间, 键) -> 匹配器
+_config_matchers: Dict[tuple, 'TextMatcher'] = {}
+
+
+class TextMatcher:
+    """Aho-Corasick 自动机：构建一次，对任意文本做线性扫描"""
+
+    def __init__(self, patterns: Iterable[str]):
+        # 去重并保持顺序；空串没有意义
+        self.patterns: List[str] = list(dict.fromkeys(p for p in patterns if p))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        self._build()
+
+    def _build(self):
+        goto, fail, out = self._goto, self._fail, self._out
+        for idx, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    fail.append(0)
+                    out.append(())
+                state = nxt
+            out[state] = out[state] + (idx,)
+
+        # BFS 计算失败指针，并把失败链上的输出合并到当前状态
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """
+        扫描文本，按结束位置顺序产出所有（可重叠的）匹配
+
+        Yields:
+            (开始字符下标, 结束字符下标（不含）, 模式)
+        """
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for idx in out[state]:
+                p = patterns[idx]
+                yield i + 1 - len(p), i + 1, p
+
+    def findall(self, text: str, overlapping: bool = True) -> List[Tuple[int, int, str]]:
+        """
+        全部匹配，按开始位置排序
+
+        overlapping=False 时从左到右取最长且互不重叠的匹配（如「也就是」不再重复计出「就是」）
+        """
+        matches = sorted(self.finditer(text), key=lambda m: (m[0], -m[1]))
+        if overlapping:
+            return matches
+        result, next_free = [], 0
+        for m in matches:
+            if m[0] >= next_free:
+                result.append(m)
+                next_free = m[1]
+        return result
+
+    def counts(self, text: str, overlapping: bool = False) -> Dict[str, int]:
+        """
+        各模式出现次数
+
+        overlapping=False 时与 str.count 相同：同一模式从左到右取不重叠的出现。
+        """
+        result = dict.fromkeys(self.patterns, 0)
+        next_free = dict.fromkeys(self.patterns, 0)
+        for start, end, p in sorted(self.finditer(text)):
+            if overlapping or start >= next_free[p]:
+                result[p] += 1
+                next_free[p] = end
+        return result
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+
+@lru_cache(maxsize=32)
+def _cached_matcher(patterns: Tuple[str, ...]) -> TextMatcher:
+    return TextMatcher(patterns)
+
+
+def get_matcher(patterns: Sequence[str]) -> TextMatcher:
+    """同一组模式只构建一次自动机"""
+    return _cached_matcher(tuple(patterns))
+
+
+def config_matcher(key: str = 'filler_words', config_path: str = None,
+                   default: Sequence[str] = ()) -> TextMatcher:
+    """
+    由 config.yaml 中的模式列表构建匹配器（按文件修改时间缓存）
+
+    Args:
+        key: 点分隔的配置键，如 'filler_words'
+        config_path: 配置文件，默认与本模块同目录的 config.yaml
+        default: 配置不存在或读取失败时使用的模式
+    """
+    config_path = config_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.yaml')
+    try:
+        mtime = os.stat(config_path).st_mtime_ns
+    except OSError:
+        return get_matcher(default)
+
+    cache_key = (os.path.abspath(config_path), mtime, key)
+    if cache_key not in _config_matchers:
+        patterns = default
+        try:
+            import yaml
+            with open(config_path, 'r', encoding='utf-8') as f:
+                value = yaml.safe_load(f) or {}
+            for part in key.split('.'):
+                value = value.get(part, {}) if isinstance(value, dict) else {}
+            if isinstance(value, list) and value:
+                patterns = value
+        except Exception as e:
+            print(f"⚠️ 读取 {key} 失败，使用默认列表: {e}")
+        _config_matchers[cache_key] = get_matcher(patterns)
+    return _config_matchers[cache_key]
+
+
+# ===== 映射回 token 与时间戳 =====
+
+def token_offsets(transcript: Transcript) -> Optional[array]:
+    """每个 token 在全文中的起始字符下标（末尾附全文长度）；逐字转录返回 None"""
+    if transcript.char_level:
+        return None
+    offsets = array('i', [0])
+    for token in transcript.tokens:
+        offsets.append(offsets[-1] + len(token))
+    return offsets
+
+
+def match_tokens(transcript: Transcript, matcher: TextMatcher, whole_tokens: bool = None,
+                 overlapping: bool = False, offsets: Optional[array] = None) -> List[Tuple[int, int, str]]:
+    """
+    在转录全文上做一次扫描，返回匹配覆盖的 token 区间
+
+    Args:
+        whole_tokens: 只保留边界与 token 边界对齐的匹配；默认对非逐字转录开启，
+                      以免模式匹配到词的一部分
+        overlapping: 是否保留相互重叠的匹配（默认取从左到右最长的不重叠匹配）
+        offsets: 预先算好的 token_offsets（可选）
+
+    Returns:
+        [(首 token 下标, 尾后 token 下标, 模式)]，按位置排序
+    """
+    if transcript.char_level:
+        return matcher.findall(transcript.text, overlapping)
+
+    if whole_tokens is None:
+        whole_tokens = True
+    offsets = offsets or token_offsets(transcript)
+    result, next_free = [], 0
+    for start, end, p in matcher.findall(transcript.text, overlapping=True):
+        first = bisect_right(offsets, start) - 1
+        last = bisect_left(offsets, end)
+        if whole_tokens and (offsets[first] != start or offsets[last] != end):
+            continue
+        if not overlapping:
+            if first < next_free:
+                continue
+            next_free = last
+        result.append((first, last, p))
+    return result
+
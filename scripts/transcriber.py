@@ -2,8 +2,12 @@ import os
 import sys
 import subprocess
 import json
-import shutil
-from funasr import AutoModel
+import time
+import queue
+import threading
+import numpy as np
+
+import model_pool
 
 # 设置控制台编码为UTF-8（仅在直接运行时）
 if sys.platform == 'win32' and __name__ == '__main__':
@@ -11,6 +15,26 @@ if sys.platform == 'win32' and __name__ == '__main__':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
+SAMPLE_RATE = 16000
+SEGMENT_LEN = 30
+
+def model_spec(backend='torch', quantize=True, threads=None, presegmented=False):
+    """
+    后端对应的模型池键
+
+    Args:
+        backend: torch（PyTorch FunASR）/ onnx（ONNX Runtime）
+        quantize: ONNX 后端是否使用 int8 量化模型
+        threads: ONNX 后端的推理线程数
+        presegmented: 输入已由能量 VAD 切成语音段（流式 / 分片的 vad 分段），
+                      torch 后端改用不挂 VAD 的批量链路
+    """
+    if backend == 'onnx':
+        return 'funasr_onnx', {'quantize': bool(quantize), 'threads': threads or os.cpu_count() or 1}
+    if presegmented:
+        return 'funasr_batch', {}
+    return 'funasr', {}
+
 def get_duration(file_path):
     cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', file_path]
     try:
@@ -20,69 +44,722 @@ def get_duration(file_path):
         print(f"❌ 获取时长失败: {e}")
         return 0
 
-def transcribe_video(video_path, output_json, temp_dir):
-    print(f"🎬 开始转录: {os.path.basename(video_path)}")
-    
-    # 1. 加载模型
-    print("⏳ 加载 FunASR 模型...")
+def decode_audio(video_path, sample_rate=SAMPLE_RATE):
+    """
+    一次性解码音轨为 16kHz 单声道 PCM（通过管道，不落临时文件）
+
+    Returns:
+        float32 NumPy 数组，取值范围 [-1, 1)
+    """
+    cmd = [
+        'ffmpeg', '-v', 'error', '-nostdin',
+        '-i', video_path,
+        '-vn', '-ac', '1', '-ar', str(sample_rate),
+        '-f', 's16le', '-acodec', 'pcm_s16le',
+        'pipe:1'
+    ]
+    proc = subprocess.run(cmd, capture_output=True, check=True)
+    pcm = np.frombuffer(proc.stdout, dtype=np.int16)
+    # 仅此一次整体转换，之后所有分段都是该数组的视图
+    return pcm.astype(np.float32) / 32768.0
+
+def stream_audio_blocks(video_path, block_sec=10, sample_rate=SAMPLE_RATE):
+    """
+    边解码边读取 ffmpeg 管道，按 block_sec 产出 float32 PCM 块
+    """
+    cmd = [
+        'ffmpeg', '-v', 'error', '-nostdin',
+        '-i', video_path,
+        '-vn', '-ac', '1', '-ar', str(sample_rate),
+        '-f', 's16le', '-acodec', 'pcm_s16le',
+        'pipe:1'
+    ]
+    block_bytes = int(block_sec * sample_rate) * 2
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     try:
-        model = AutoModel(
-            model="paraformer-zh",
-            vad_model="fsmn-vad",
-            punc_model="ct-punc",
-            disable_update=True
+        while True:
+            data = proc.stdout.read(block_bytes)
+            if not data:
+                break
+            # 奇数字节只可能出现在流末尾，丢弃半个采样点
+            data = data[:len(data) // 2 * 2]
+            yield np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+        if proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=proc.stderr.read())
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+def _frame_energy_db(pcm, frame_len):
+    """逐帧能量 (dB)，einsum 避免生成整段平方副本"""
+    n = len(pcm) // frame_len
+    frames = pcm[:n * frame_len].reshape(n, frame_len)
+    power = np.einsum('ij,ij->i', frames, frames) / frame_len
+    return 10 * np.log10(power + 1e-10)
+
+def _runs(mask):
+    """布尔序列中连续 True 的 [起, 止) 帧区间"""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges.reshape(-1, 2)
+
+def detect_speech(pcm, sample_rate=SAMPLE_RATE, frame_ms=30, margin_db=12.0,
+                  max_threshold_db=-35.0, min_speech_ms=200, min_silence_ms=500, pad_ms=150):
+    """
+    基于帧能量的快速语音检测
+
+    噪声底取能量分布的 10% 分位，高出 margin_db 的帧视为语音
+    （阈值不超过 max_threshold_db，避免整段都是语音时噪声底被抬高）；
+    短于 min_silence_ms 的停顿并入语音，短于 min_speech_ms 的语音丢弃。
+
+    Returns:
+        [(起始采样点, 结束采样点), ...]，已按 pad_ms 向两侧扩展
+    """
+    frame_len = int(sample_rate * frame_ms / 1000)
+    if len(pcm) < frame_len:
+        return [(0, len(pcm))] if len(pcm) else []
+
+    energy = _frame_energy_db(pcm, frame_len)
+    threshold = min(max(np.percentile(energy, 10) + margin_db, -60.0), max_threshold_db)
+    voiced = energy > threshold
+
+    # 填补短停顿
+    min_silence = max(1, min_silence_ms // frame_ms)
+    for s, e in _runs(~voiced):
+        if 0 < s and e < len(voiced) and e - s < min_silence:
+            voiced[s:e] = True
+
+    min_speech = max(1, min_speech_ms // frame_ms)
+    pad = int(pad_ms * sample_rate / 1000)
+    regions = []
+    for s, e in _runs(voiced):
+        if e - s < min_speech:
+            continue
+        start = max(0, int(s) * frame_len - pad)
+        end = min(len(pcm), int(e) * frame_len + pad)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+def split_long_region(pcm, start, end, max_len, sample_rate=SAMPLE_RATE, frame_ms=30):
+    """
+    将超过 max_len 采样点的语音区间切成多段，
+    切点选在每个窗口后半段能量最低的帧，尽量不切断字词
+    """
+    frame_len = int(sample_rate * frame_ms / 1000)
+    pieces = []
+    while end - start > max_len:
+        lo = start + max_len // 2
+        window = pcm[lo:start + max_len]
+        if len(window) >= frame_len:
+            energy = _frame_energy_db(window, frame_len)
+            cut = lo + int(np.argmin(energy)) * frame_len
+        else:
+            cut = start + max_len
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, end))
+    return pieces
+
+def iter_speech_chunks(pcm, max_chunk_sec=SEGMENT_LEN, sample_rate=SAMPLE_RATE):
+    """VAD 优先切分：只返回语音区间，过长区间按 max_chunk_sec 封顶"""
+    max_len = int(max_chunk_sec * sample_rate)
+    regions = detect_speech(pcm, sample_rate)
+
+    speech = sum(e - s for s, e in regions)
+    total = max(len(pcm), 1)
+    print(f"🔇 VAD: 语音占比 {speech / total * 100:.1f}%, 跳过静音 {(len(pcm) - speech) / sample_rate:.1f} 秒")
+
+    for start, end in regions:
+        for s, e in split_long_region(pcm, start, end, max_len, sample_rate):
+            yield s / sample_rate, pcm[s:e]
+
+def iter_stream_chunks(video_path, segmentation='vad', max_chunk_sec=SEGMENT_LEN,
+                       sample_rate=SAMPLE_RATE, counters=None):
+    """
+    从 ffmpeg 管道增量切分：固定时长或 VAD 优先
+
+    VAD 模式下每攒够两个最长分段就检测一次，只产出已确定结束的语音区间，
+    跨越缓冲区末尾的区间留到下一轮，连续语音超过上限时按上限切开。
+
+    Args:
+        counters: 可选字典，累计 total_samples / speech_samples
+    """
+    max_len = int(max_chunk_sec * sample_rate)
+    window = max_len * 2
+    guard = sample_rate  # 末尾 1 秒内结束的区间可能尚未说完
+    counters = counters if counters is not None else {}
+    counters.setdefault('total_samples', 0)
+    counters.setdefault('speech_samples', 0)
+
+    buf = np.zeros(0, dtype=np.float32)
+    buf_offset = 0  # buf[0] 对应的绝对采样点
+
+    def emit(pieces):
+        for s, e in pieces:
+            counters['speech_samples'] += e - s
+            yield (buf_offset + s) / sample_rate, buf[s:e]
+
+    blocks = stream_audio_blocks(video_path, sample_rate=sample_rate)
+    eof = False
+    while not eof:
+        block = next(blocks, None)
+        if block is None:
+            eof = True
+        else:
+            counters['total_samples'] += len(block)
+            buf = np.concatenate((buf, block))
+            if len(buf) < window:
+                continue
+
+        if segmentation != 'vad':
+            end = len(buf) if eof else len(buf) // max_len * max_len
+            yield from emit((s, min(s + max_len, end)) for s in range(0, end, max_len))
+            buf, buf_offset = buf[end:], buf_offset + end
+            continue
+
+        regions = detect_speech(buf, sample_rate)
+        keep_from = len(buf) if eof else max(0, len(buf) - guard)
+        pieces = []
+        for start, end in regions:
+            if eof or end < len(buf) - guard:
+                pieces.extend(split_long_region(buf, start, end, max_len, sample_rate))
+                continue
+            # 未结束的区间：过长部分先切出，剩余部分留待下一轮
+            parts = split_long_region(buf, start, end, max_len, sample_rate)
+            pieces.extend(parts[:-1])
+            keep_from = parts[-1][0]
+            break
+
+        yield from emit(pieces)
+        buf, buf_offset = buf[keep_from:], buf_offset + keep_from
+
+def _prefetch(iterable, depth):
+    """
+    生产者-消费者：后台线程驱动 iterable，经有界队列交给调用方
+
+    队列满时生产者阻塞（背压）；调用方提前退出时通知生产者停止。
+    """
+    q = queue.Queue(maxsize=max(1, int(depth)))
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(('item', item)):
+                    break
+        except BaseException as e:
+            put(('error', e))
+        finally:
+            put(('done', done))
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    worker = threading.Thread(target=produce, name="audio-producer", daemon=True)
+    worker.start()
+    try:
+        while True:
+            kind, item = q.get()
+            if kind == 'error':
+                raise item
+            if kind == 'done':
+                break
+            yield item
+    finally:
+        stop.set()
+        worker.join()
+
+class TranscriptCheckpoint:
+    """
+    转录断点日志（JSONL）
+
+    首行为头信息（源文件与分段参数），之后每行记录一个已完成分段：
+    {"offset": 起始采样点, "chars": [...]}。每批推理后追加并 fsync，
+    进程被中断后重跑可跳过已完成分段，结束时由调用方合并为最终转录。
+    """
+
+    def __init__(self, path, video_path, params):
+        self.path = path
+        st = os.stat(video_path)
+        self.header = {
+            'type': 'header',
+            'video_path': os.path.abspath(video_path),
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'params': params
+        }
+        self.done = {}
+        self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if self._file.tell() == 0:
+            self._write(self.header)
+
+    def _load(self):
+        """读取已有断点；头信息不匹配时作废重来，末尾残缺行直接丢弃"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+
+        valid = []
+        for line in lines:
+            try:
+                valid.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+
+        if not valid or valid[0] != self.header:
+            os.remove(self.path)
+            return
+
+        for record in valid[1:]:
+            self.done[record['offset']] = record['chars']
+
+        # 截掉残缺尾行，保证之后追加的行从行首开始
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for record in valid:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+        if self.done:
+            print(f"♻️ 从断点恢复: 已完成 {len(self.done)} 个分段")
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def append(self, results):
+        """追加一批 (offset, chars) 并落盘"""
+        for offset, chars in results:
+            self.done[offset] = chars
+            self._write({'offset': offset, 'chars': chars})
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def compact(self):
+        """按分段起点合并所有结果"""
+        all_chars = []
+        for offset in sorted(self.done):
+            all_chars.extend(self.done[offset])
+        return all_chars
+
+    def close(self):
+        self._file.close()
+
+def _collect_chars(res, offset_sec, all_chars):
+    """把 model.generate 的结果换算为绝对时间并追加到 all_chars"""
+    if not res:
+        return
+    for item in res:
+        if 'timestamp' in item and 'text' in item:
+            text = item['text'].replace(' ', '')
+            timestamps = item['timestamp']
+            valid_len = min(len(text), len(timestamps))
+            for k in range(valid_len):
+                all_chars.append({
+                    'char': text[k],
+                    'start': round(offset_sec * 1000 + timestamps[k][0]),
+                    'end': round(offset_sec * 1000 + timestamps[k][1])
+                })
+
+def _infer_batch(model, batch):
+    """
+    一次 generate 调用处理一批 (起始秒, PCM切片)
+
+    批量调用出错或结果条数与输入不一致时，逐段重跑
+
+    Returns:
+        与 batch 一一对应的字符列表
+    """
+    chunks = [chunk for _, chunk in batch]
+    res = None
+    try:
+        res = model.generate(
+            input=chunks if len(chunks) > 1 else chunks[0],
+            batch_size=len(chunks),
+            return_raw_text=True,
+            timestamp_granularity="character"
         )
     except Exception as e:
-        print(f"❌ 模型加载失败: {e}")
-        return False
+        if len(batch) == 1:
+            raise
+        print(f"⚠️ 批量推理失败，逐段重试: {e}")
 
-    # 2. 分段转录
+    results = []
+    if res and len(res) == len(batch):
+        for (offset_sec, _), item in zip(batch, res):
+            chars = []
+            _collect_chars([item], offset_sec, chars)
+            results.append(chars)
+    else:
+        # 无法按输入对应偏移，逐段重跑
+        for offset_sec, chunk in batch:
+            res = model.generate(input=chunk, return_raw_text=True, timestamp_granularity="character")
+            chars = []
+            _collect_chars(res, offset_sec, chars)
+            results.append(chars)
+    return results
+
+def _print_throughput(num_chunks, audio_sec, infer_sec, batch_size):
+    """输出推理吞吐，用于按机器调整 batch_size"""
+    chunks_per_sec = num_chunks / infer_sec if infer_sec > 0 else 0
+    rtf = infer_sec / audio_sec if audio_sec > 0 else 0
+    print(f"⚡ 推理吞吐: {chunks_per_sec:.2f} 段/秒, RTF={rtf:.3f} (batch_size={batch_size})")
+    return {
+        'chunks': num_chunks,
+        'audio_sec': round(audio_sec, 2),
+        'infer_sec': round(infer_sec, 2),
+        'chunks_per_sec': round(chunks_per_sec, 3),
+        'rtf': round(rtf, 4),
+        'batch_size': batch_size
+    }
+
+def _transcribe_streaming(model, video_path, batch_size=1, segmentation='vad',
+                          max_chunk_sec=SEGMENT_LEN, queue_depth=4, checkpoint=None):
+    """
+    流式模式：整段只解码一次，分段以切片形式按批送入模型
+
+    解码与切分在生产者线程中进行，第 i 批推理时第 i+1 批已在准备；
+    传入 checkpoint 时跳过已完成分段，每批结果追加到断点日志
+    """
+    all_chars = []
+
+    batch_size = max(1, int(batch_size))
+    num_chunks = 0
+    infer_sec = 0.0
+    batch = []
+
+    def flush():
+        nonlocal infer_sec
+        t0 = time.perf_counter()
+        results = _infer_batch(model, batch)
+        infer_sec += time.perf_counter() - t0
+        if checkpoint:
+            checkpoint.append([
+                (round(offset_sec * SAMPLE_RATE), chars)
+                for (offset_sec, _), chars in zip(batch, results)
+            ])
+        else:
+            for chars in results:
+                all_chars.extend(chars)
+        batch.clear()
+
+    counters = {}
+    producer = iter_stream_chunks(video_path, segmentation, max_chunk_sec, counters=counters)
+    chunks = _prefetch(producer, queue_depth)
+
+    audio_sec = 0.0
+    for offset_sec, chunk in chunks:
+        if checkpoint and round(offset_sec * SAMPLE_RATE) in checkpoint.done:
+            continue
+        audio_sec += len(chunk) / SAMPLE_RATE
+        batch.append((offset_sec, chunk))
+        num_chunks += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    total_sec = counters['total_samples'] / SAMPLE_RATE
+    if segmentation == 'vad':
+        speech_sec = counters['speech_samples'] / SAMPLE_RATE
+        ratio = speech_sec / total_sec * 100 if total_sec > 0 else 0
+        print(f"🔇 VAD: 语音占比 {ratio:.1f}%, 跳过静音 {total_sec - speech_sec:.1f} 秒")
+
+    if checkpoint:
+        all_chars = checkpoint.compact()
+
+    duration = get_duration(video_path) or total_sec
+    stats = _print_throughput(num_chunks, audio_sec, infer_sec, batch_size)
+    return duration, all_chars, stats
+
+def decode_audio_to_file(video_path, pcm_path, sample_rate=SAMPLE_RATE):
+    """
+    一次性解码为 float32 原始 PCM 文件，供多进程以内存映射方式共享
+
+    Returns:
+        采样点数
+    """
+    cmd = [
+        'ffmpeg', '-y', '-v', 'error', '-nostdin',
+        '-i', video_path,
+        '-vn', '-ac', '1', '-ar', str(sample_rate),
+        '-f', 'f32le', '-acodec', 'pcm_f32le',
+        pcm_path
+    ]
+    subprocess.run(cmd, capture_output=True, check=True)
+    return os.path.getsize(pcm_path) // 4
+
+def plan_shards(num_samples, num_shards, overlap_sec=3.0, sample_rate=SAMPLE_RATE):
+    """
+    把音频均分为 num_shards 份，相邻分片各向外扩展 overlap_sec
+
+    Returns:
+        [(分片起点, 分片终点, 名义起点, 名义终点), ...]（采样点）
+    """
+    overlap = int(overlap_sec * sample_rate)
+    bounds = [round(num_samples * k / num_shards) for k in range(num_shards + 1)]
+    shards = []
+    for k in range(num_shards):
+        lo, hi = bounds[k], bounds[k + 1]
+        shards.append((max(0, lo - overlap), min(num_samples, hi + overlap), lo, hi))
+    return shards
+
+def _init_shard_worker(threads, spec):
+    """分片工作进程初始化：限制线程数并常驻加载模型"""
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    kind, params = spec
+    model_pool.default_pool.warm_up(kind, **params)
+
+def _transcribe_shard(pcm_path, num_samples, shard, segmentation, max_chunk_sec, batch_size, spec):
+    """在工作进程中转录一个分片，返回绝对时间的字符列表"""
+    start, end = shard[0], shard[1]
+    pcm = np.memmap(pcm_path, dtype=np.float32, mode='r', shape=(num_samples,))
+    view = pcm[start:end]
+    base_sec = start / SAMPLE_RATE
+
+    if segmentation == 'vad':
+        regions = detect_speech(view)
+        max_len = int(max_chunk_sec * SAMPLE_RATE)
+        pieces = [p for s, e in regions for p in split_long_region(view, s, e, max_len)]
+    else:
+        step = int(max_chunk_sec * SAMPLE_RATE)
+        pieces = [(s, min(s + step, len(view))) for s in range(0, len(view), step)]
+
+    kind, params = spec
+    with model_pool.default_pool.lease(kind, **params) as model:
+        chars = []
+        for i in range(0, len(pieces), batch_size):
+            batch = [(base_sec + s / SAMPLE_RATE, np.asarray(view[s:e])) for s, e in pieces[i:i + batch_size]]
+            for result in _infer_batch(model, batch):
+                chars.extend(result)
+    return chars
+
+def reconcile_boundary(left, right, boundary_ms, overlap_ms):
+    """
+    合并相邻分片在重叠区的结果
+
+    在 [边界 - overlap/2, 边界 + overlap/2] 内取左分片相邻字符间最大的停顿，
+    以其中点为切点（无字符时取名义边界；并列时取最早者），
+    左分片保留中点早于切点的字符，右分片保留其余字符。结果与进程调度无关。
+    """
+    lo, hi = boundary_ms - overlap_ms / 2, boundary_ms + overlap_ms / 2
+    inner = [c for c in left if lo <= c['start'] and c['end'] <= hi]
+
+    cut = boundary_ms
+    best_gap = -1
+    for a, b in zip(inner, inner[1:]):
+        gap = b['start'] - a['end']
+        if gap > best_gap:
+            best_gap = gap
+            cut = (a['end'] + b['start']) / 2
+
+    mid = lambda c: (c['start'] + c['end']) / 2
+    return [c for c in left if mid(c) < cut], [c for c in right if mid(c) >= cut]
+
+def _transcribe_sharded(video_path, temp_dir, shards, segmentation, max_chunk_sec,
+                        batch_size=1, overlap_sec=3.0, pcm_path=None, num_samples=None,
+                        backend='torch', quantize=True):
+    """
+    分片并行模式：解码一次写入内存映射文件，K 个重叠分片在进程池中转录后合并
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import importlib
+
+    if pcm_path is None:
+        pcm_path = os.path.join(temp_dir, "audio.f32")
+        num_samples = decode_audio_to_file(video_path, pcm_path)
+
+    plan = plan_shards(num_samples, shards, overlap_sec)
+    threads = max(1, (os.cpu_count() or 1) // shards)
+    spec = model_spec(backend, quantize, threads, presegmented=segmentation == 'vad')
+    print(f"🧩 分片并行: {shards} 个进程 × {threads} 线程, 重叠 {overlap_sec} 秒")
+
+    # 工作函数须取自按名导入的模块，才能被子进程正确反序列化
+    worker = importlib.import_module('transcriber')
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=shards, initializer=worker._init_shard_worker,
+                             initargs=(threads, spec)) as executor:
+        futures = [
+            executor.submit(worker._transcribe_shard, pcm_path, num_samples, shard,
+                            segmentation, max_chunk_sec, max(1, int(batch_size)), spec)
+            for shard in plan
+        ]
+        results = [f.result() for f in futures]
+    wall_sec = time.perf_counter() - t0
+
+    # 按分片顺序两两调和边界
+    overlap_ms = overlap_sec * 1000
+    merged = results[0]
+    for k in range(1, len(results)):
+        boundary_ms = plan[k][2] / SAMPLE_RATE * 1000
+        merged, right = reconcile_boundary(merged, results[k], boundary_ms, overlap_ms)
+        merged = merged + right
+
+    audio_sec = num_samples / SAMPLE_RATE
+    print(f"⚡ 分片转录耗时 {wall_sec:.1f} 秒, RTF={wall_sec / audio_sec if audio_sec else 0:.3f}")
+    return audio_sec, merged, wall_sec
+
+def benchmark_sharding(max_workers, duration_sec=600, temp_dir=None):
+    """
+    用合成长录音测试 1..max_workers 个分片进程的扩展性
+
+    合成音频为随机长度的调制噪声段与静音段交替，模拟口播节奏。
+    """
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    n = int(duration_sec * SAMPLE_RATE)
+    pcm = (rng.standard_normal(n) * 0.002).astype(np.float32)
+    pos = 0
+    while pos < n:
+        speech = int(rng.uniform(2, 12) * SAMPLE_RATE)
+        t = np.arange(min(speech, n - pos)) / SAMPLE_RATE
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+        pcm[pos:pos + len(t)] += (rng.standard_normal(len(t)) * 0.2 * envelope).astype(np.float32)
+        pos += speech + int(rng.uniform(0.3, 3) * SAMPLE_RATE)
+
+    temp_dir = temp_dir or tempfile.mkdtemp()
+    pcm_path = os.path.join(temp_dir, "bench.f32")
+    pcm.tofile(pcm_path)
+
+    workers = [1]
+    while workers[-1] * 2 <= max_workers:
+        workers.append(workers[-1] * 2)
+    if workers[-1] != max_workers:
+        workers.append(max_workers)
+
+    print(f"\n📊 分片扩展性测试（合成录音 {duration_sec / 60:.0f} 分钟）")
+    baseline = None
+    for k in workers:
+        _, _, wall = _transcribe_sharded(None, temp_dir, k, 'vad', SEGMENT_LEN,
+                                         pcm_path=pcm_path, num_samples=n)
+        baseline = baseline or wall
+        print(f"  {k:>3} 进程: {wall:7.1f} 秒  加速比 {baseline / wall:.2f}x  RTF={wall / duration_sec:.3f}")
+
+    os.remove(pcm_path)
+
+def _transcribe_segmented(model, video_path, temp_dir):
+    """旧模式：每段单独调用 ffmpeg 导出 WAV"""
     duration = get_duration(video_path)
-    SEGMENT_LEN = 30
     all_chars = []
-    
+
     num_segments = int(duration // SEGMENT_LEN) + 1
-    
+
     for i in range(num_segments):
         start = i * SEGMENT_LEN
         dur = min(SEGMENT_LEN, duration - start)
         if dur <= 0: continue
-        
+
         wav_path = os.path.join(temp_dir, f"seg_{i}.wav")
-        
+
+        # -ss 放在 -i 之前走输入端快速定位，避免每段都从头解码
         cmd = [
-            'ffmpeg', '-y', '-i', video_path, 
-            '-ss', str(start), '-t', str(dur),
-            '-vn', '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', 
+            'ffmpeg', '-y', '-ss', str(start), '-i', video_path,
+            '-t', str(dur),
+            '-vn', '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE), '-ac', '1',
             wav_path
         ]
         subprocess.run(cmd, capture_output=True, check=True)
-        
+
         # 转录
         res = model.generate(input=wav_path, return_raw_text=True, timestamp_granularity="character")
-        
-        if res:
-             for item in res:
-                if 'timestamp' in item and 'text' in item:
-                    text = item['text'].replace(' ', '')
-                    timestamps = item['timestamp']
-                    valid_len = min(len(text), len(timestamps))
-                    for k in range(valid_len):
-                        all_chars.append({
-                            'char': text[k],
-                            'start': round(start * 1000 + timestamps[k][0]),
-                            'end': round(start * 1000 + timestamps[k][1])
-                        })
-        
+        _collect_chars(res, start, all_chars)
+
         if os.path.exists(wav_path):
             os.remove(wav_path)
+
+    return duration, all_chars, None
+
+def transcribe_video(video_path, output_json, temp_dir, streaming=True, pool=None, batch_size=1,
+                     segmentation='vad', max_chunk_sec=SEGMENT_LEN, queue_depth=4, resume=True,
+                     shards=1, backend='torch', quantize=True, overlap_sec=3.0):
+    print(f"🎬 开始转录: {os.path.basename(video_path)}")
+    pool = pool or model_pool.default_pool
+
+    if shards > 1:
+        pcm_path = os.path.join(temp_dir, "audio.f32")
+        try:
+            audio_sec, all_chars, wall_sec = _transcribe_sharded(
+                video_path, temp_dir, shards, segmentation, max_chunk_sec, batch_size,
+                overlap_sec=overlap_sec, backend=backend, quantize=quantize
+            )
+        finally:
+            if os.path.exists(pcm_path):
+                os.remove(pcm_path)
+        duration = get_duration(video_path) or audio_sec
+        stats = {'shards': shards, 'audio_sec': round(audio_sec, 2), 'infer_sec': round(wall_sec, 2),
+                 'rtf': round(wall_sec / audio_sec, 4) if audio_sec else 0}
+        return _save_transcript(video_path, output_json, duration, all_chars, stats)
+
+    kind, params = model_spec(backend, quantize, presegmented=streaming and segmentation == 'vad')
+    checkpoint = None
+    if streaming and resume:
+        checkpoint = TranscriptCheckpoint(
+            output_json + '.ckpt.jsonl',
+            video_path,
+            {'segmentation': segmentation, 'max_chunk': max_chunk_sec, 'backend': kind, **params}
+        )
     
-    # 保存结果
+    # 1. 获取模型（模型池中已预热则直接复用）
+    print(f"⏳ 加载 FunASR 模型 ({backend})...")
+    try:
+        model = pool.acquire(kind, **params)
+    except Exception as e:
+        print(f"❌ 模型加载失败: {e}")
+        if checkpoint:
+            checkpoint.close()
+        return False
+
+    # 2. 分段转录
+    try:
+        if streaming:
+            duration, all_chars, stats = _transcribe_streaming(
+                model, video_path, batch_size, segmentation, max_chunk_sec, queue_depth, checkpoint
+            )
+        else:
+            duration, all_chars, stats = _transcribe_segmented(model, video_path, temp_dir)
+    finally:
+        pool.release(kind, **params)
+        if checkpoint:
+            checkpoint.close()
+
+    saved = _save_transcript(video_path, output_json, duration, all_chars, stats)
+
+    # 最终转录已写出，断点日志不再需要
+    if checkpoint and os.path.exists(checkpoint.path):
+        os.remove(checkpoint.path)
+    return saved
+
+def _save_transcript(video_path, output_json, duration, all_chars, stats):
+    """保存结果"""
     result_data = {
         "video_path": video_path,
         "duration_ms": duration * 1000,
         "segments": all_chars
     }
+    if stats:
+        result_data["asr_stats"] = stats
     
     with open(output_json, 'w', encoding='utf-8') as f:
         json.dump(result_data, f, ensure_ascii=False, indent=2)
@@ -91,7 +768,34 @@ def transcribe_video(video_path, output_json, temp_dir):
     return True
 
 if __name__ == "__main__":
-    if len(sys.argv) < 4:
-        print("Usage: python transcriber.py <input_video> <output_json> <temp_dir>")
-        sys.exit(1)
-    transcribe_video(sys.argv[1], sys.argv[2], sys.argv[3])
+    import argparse
+    if '--benchmark-shards' in sys.argv:
+        bench = argparse.ArgumentParser()
+        bench.add_argument("--benchmark-shards", type=int, required=True, help="最多测试的分片进程数")
+        bench.add_argument("--duration", type=float, default=600, help="合成录音时长（秒）")
+        bench_args = bench.parse_args()
+        benchmark_sharding(bench_args.benchmark_shards, bench_args.duration)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video", help="输入视频")
+    parser.add_argument("output", help="输出转录JSON文件")
+    parser.add_argument("temp_dir", help="临时目录")
+    parser.add_argument("--segmented", action="store_true", help="使用旧的逐段导出WAV模式")
+    parser.add_argument("--batch-size", type=int, default=1, help="每次 generate 调用处理的分段数")
+    parser.add_argument("--segmentation", choices=['vad', 'fixed'], default='vad', help="分段方式")
+    parser.add_argument("--max-chunk", type=float, default=SEGMENT_LEN, help="单段最长秒数")
+    parser.add_argument("--queue-depth", type=int, default=4, help="解码/推理之间的预取队列深度")
+    parser.add_argument("--no-resume", action="store_true", help="忽略断点，从头转录")
+    parser.add_argument("--shards", type=int, default=1, help="分片并行的进程数（>1 启用）")
+    parser.add_argument("--shard-overlap", type=float, default=3.0, help="相邻分片的重叠秒数")
+    parser.add_argument("--backend", choices=['torch', 'onnx'], default='torch', help="推理后端")
+    parser.add_argument("--float32", action="store_true", help="ONNX 后端不使用 int8 量化")
+    args = parser.parse_args()
+
+    transcribe_video(args.video, args.output, args.temp_dir,
+                     streaming=not args.segmented, batch_size=args.batch_size,
+                     segmentation=args.segmentation, max_chunk_sec=args.max_chunk,
+                     queue_depth=args.queue_depth, resume=not args.no_resume,
+                     shards=args.shards, backend=args.backend, quantize=not args.float32,
+                     overlap_sec=args.shard_overlap)
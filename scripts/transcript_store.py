@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+转录存储 - 紧凑的列式二进制转录格式与统一访问接口
+
+二进制格式（.vct，小端序）：
+    b'VCTR' | 版本 u16 | 保留 u16 | 头长度 u32 | 头 JSON | 对齐填充
+    starts int32[n] | ends int32[n] | [token 偏移 int32[n+1]]
+    | [句子首 token int32[k] | 句子尾后 token int32[k]]（v2）| 文本 UTF-8
+
+所有阶段通过 Transcript.load() 读取，JSON 与二进制格式自动识别，
+时间数组以内存映射方式按需读取，不再为每个字符构造 dict。
+SentenceIndex 在此之上提供句子表（计算一次后写回二进制文件）。
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+import argparse
+from array import array
+from bisect import bisect_right
+from typing import Dict, List, Sequence, Tuple
+
+# 设置控制台编码为UTF-8（仅在直接运行时）
+if sys.platform == 'win32' and __name__ == '__main__':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+MAGIC = b'VCTR'
+VERSION = 2
+_PREFIX = struct.Struct('<4sHHI')
+
+
+def _int32_view(buf, offset: int, count: int) -> Sequence[int]:
+    """从缓冲区取 int32 数组：小端机器上零拷贝，否则复制并转换字节序"""
+    view = memoryview(buf)[offset:offset + count * 4]
+    if sys.byteorder == 'little':
+        return view.cast('i')
+    arr = array('i', view.tobytes())
+    arr.byteswap()
+    return arr
+
+
+def _int32_bytes(values: Sequence[int]) -> bytes:
+    arr = array('i', values)
+    if sys.byteorder != 'little':
+        arr.byteswap()
+    return arr.tobytes()
+
+
+class Transcript:
+    """
+    转录访问接口
+
+    Attributes:
+        video_path: 源视频路径
+        duration_ms: 视频时长（毫秒）
+        starts / ends: 每个 token 的起止时间（毫秒，int32 序列）
+        tokens: token 序列；字符级转录时即为 text 本身
+    """
+
+    def __init__(self, video_path: str, duration_ms: float, tokens: Sequence[str],
+                 starts: Sequence[int], ends: Sequence[int], extra: Dict = None):
+        self.video_path = video_path
+        self.duration_ms = duration_ms
+        self.starts = starts
+        self.ends = ends
+        self.extra = extra or {}
+        self._tokens = tokens
+        self._text = None
+        self._mmap = None
+        # 句子表：(首 token 下标序列, 尾后 token 下标序列)，规则见 SENTENCE_RULE
+        self.sentences = None
+
+    # ===== 构造 =====
+
+    @classmethod
+    def from_segments(cls, segments: List[Dict], video_path: str = '', duration_ms: float = 0,
+                      extra: Dict = None) -> 'Transcript':
+        """由旧的 [{'char','start','end'}, ...] 列表构造"""
+        tokens = [s['char'] for s in segments]
+        if all(len(t) == 1 for t in tokens):
+            tokens = ''.join(tokens)
+        return cls(
+            video_path,
+            duration_ms,
+            tokens,
+            array('i', (int(s['start']) for s in segments)),
+            array('i', (int(s['end']) for s in segments)),
+            extra
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'Transcript':
+        """读取转录文件，自动识别二进制 (.vct) 与 JSON 格式"""
+        if is_binary(path):
+            return cls._load_binary(path)
+
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        extra = {k: v for k, v in data.items() if k not in ('video_path', 'duration_ms', 'segments')}
+        return cls.from_segments(data['segments'], data.get('video_path', ''),
+                                 data.get('duration_ms', 0), extra)
+
+    @classmethod
+    def _load_binary(cls, path: str) -> 'Transcript':
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, header_len = _PREFIX.unpack_from(mm, 0)
+        if version > VERSION:
+            mm.close()
+            raise ValueError(f"不支持的转录格式版本: {version}（当前支持 {VERSION}）")
+
+        pos = _PREFIX.size
+        header = json.loads(bytes(mm[pos:pos + header_len]).decode('utf-8'))
+        pos = _align4(pos + header_len)
+
+        n = header['count']
+        starts = _int32_view(mm, pos, n)
+        pos += n * 4
+        ends = _int32_view(mm, pos, n)
+        pos += n * 4
+
+        offsets = None
+        if not header['char_level']:
+            offsets = _int32_view(mm, pos, n + 1)
+            pos += (n + 1) * 4
+
+        sentences = None
+        sentence_header = header.get('sentences')
+        if sentence_header:
+            k = sentence_header['count']
+            sentences = (_int32_view(mm, pos, k), _int32_view(mm, pos + k * 4, k))
+            pos += k * 8
+            if sentence_header.get('rule') != SENTENCE_RULE:
+                sentences = None  # 分句规则已变化，需重新计算
+
+        text_slice = (pos, pos + header['text_bytes'])
+        t = cls(header.get('video_path', ''), header.get('duration_ms', 0),
+                None, starts, ends, header.get('extra'))
+        t.sentences = sentences
+        t._mmap = mm
+        t._text_slice = text_slice
+        t._offsets = offsets
+        return t
+
+    # ===== 访问 =====
+
+    @property
+    def text(self) -> str:
+        """全文（首次访问时才解码）"""
+        if self._text is None:
+            if self._tokens is None:
+                a, b = self._text_slice
+                self._text = bytes(self._mmap[a:b]).decode('utf-8')
+            elif isinstance(self._tokens, str):
+                self._text = self._tokens
+            else:
+                self._text = ''.join(self._tokens)
+        return self._text
+
+    @property
+    def tokens(self) -> Sequence[str]:
+        """token 序列，下标与 starts/ends 对应"""
+        if self._tokens is None:
+            text = self.text
+            offsets = self._offsets
+            if offsets is None:
+                self._tokens = text
+            else:
+                self._tokens = [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        return self._tokens
+
+    @property
+    def char_level(self) -> bool:
+        """是否每个 token 恰好一个字符（此时 text[i] 即第 i 个 token）"""
+        return isinstance(self.tokens, str)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: int) -> Dict:
+        """兼容旧代码的 {'char','start','end'} 访问"""
+        return {'char': self.tokens[i], 'start': self.starts[i], 'end': self.ends[i]}
+
+    def sentence_table(self) -> Tuple[Sequence[int], Sequence[int]]:
+        """句子表（已持久化则直接读取，否则按 SENTENCE_RULE 计算）"""
+        if self.sentences is None:
+            self.sentences = split_sentences(self)
+        return self.sentences
+
+    def iter_segments(self):
+        """逐个产出旧格式 dict（只在需要时构造）"""
+        tokens, starts, ends = self.tokens, self.starts, self.ends
+        for i in range(len(starts)):
+            yield {'char': tokens[i], 'start': starts[i], 'end': ends[i]}
+
+    # ===== 写出 =====
+
+    def save(self, path: str):
+        """写出二进制格式（先写临时文件再替换）"""
+        tokens = self.tokens
+        char_level = isinstance(tokens, str)
+        text_bytes = self.text.encode('utf-8')
+
+        header = {
+            'video_path': self.video_path,
+            'duration_ms': self.duration_ms,
+            'count': len(self),
+            'char_level': char_level,
+            'text_bytes': len(text_bytes),
+            'extra': self.extra
+        }
+        if self.sentences is not None:
+            header['sentences'] = {'count': len(self.sentences[0]), 'rule': SENTENCE_RULE}
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_PREFIX.pack(MAGIC, VERSION, 0, len(header_bytes)))
+            f.write(header_bytes)
+            f.write(b'\0' * (_align4(f.tell()) - f.tell()))
+            f.write(_int32_bytes(self.starts))
+            f.write(_int32_bytes(self.ends))
+            if not char_level:
+                offsets = [0]
+                for token in tokens:
+                    offsets.append(offsets[-1] + len(token))
+                f.write(_int32_bytes(offsets))
+            if self.sentences is not None:
+                f.write(_int32_bytes(self.sentences[0]))
+                f.write(_int32_bytes(self.sentences[1]))
+            f.write(text_bytes)
+        os.replace(tmp_path, path)
+
+    def to_json(self, path: str):
+        """写出旧的 JSON 格式"""
+        data = {
+            'video_path': self.video_path,
+            'duration_ms': self.duration_ms,
+            'segments': list(self.iter_segments())
+        }
+        data.update(self.extra)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def close(self):
+        """释放内存映射"""
+        if self._mmap is not None:
+            if self._tokens is None:
+                self._tokens = self.tokens
+            self.starts = array('i', self.starts)
+            self.ends = array('i', self.ends)
+            if self.sentences is not None:
+                self.sentences = tuple(array('i', col) for col in self.sentences)
+            self._offsets = None
+            try:
+                self._mmap.close()
+            except BufferError:
+                # 调用方仍持有切片视图，交给垃圾回收释放
+                pass
+            self._mmap = None
+
+
+def is_binary(path: str) -> bool:
+    """是否为二进制 (.vct) 转录文件"""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _align4(n: int) -> int:
+    return (n + 3) & ~3
+
+
+# 分句规则：遇到句末标点断句；非末尾字符后停顿超过 gap_ms 也断句
+SENTENCE_RULE = {'enders': '。！？…\n', 'gap_ms': 500}
+
+
+def split_sentences(transcript: Transcript) -> Tuple[array, array]:
+    """
+    按 SENTENCE_RULE 分句
+
+    Returns:
+        (首 token 下标, 尾后 token 下标)，去除首尾空白后为空的句子不计入
+    """
+    tokens, starts, ends = transcript.tokens, transcript.starts, transcript.ends
+    enders = set(SENTENCE_RULE['enders'])
+    gap_ms = SENTENCE_RULE['gap_ms']
+    n = len(transcript)
+
+    firsts, lasts = array('i'), array('i')
+    first = None
+
+    def close(last):
+        if ''.join(tokens[first:last]).strip():
+            firsts.append(first)
+            lasts.append(last)
+
+    for i in range(n):
+        if first is None:
+            first = i
+        if tokens[i] in enders:
+            close(i + 1)
+            first = None
+        elif i < n - 1 and starts[i + 1] - ends[i] > gap_ms:
+            close(i + 1)
+            first = None
+
+    if first is not None:
+        close(n)
+    return firsts, lasts
+
+
+class SentenceIndex:
+    """
+    转录句子索引
+
+    句子表（每句首 token / 尾后 token 下标）只计算一次并缓存在 Transcript 上，
+    二进制转录写回后下次直接读取。
+    """
+
+    def __init__(self, transcript: Transcript):
+        self.transcript = transcript
+        self.sentence_firsts, self.sentence_lasts = transcript.sentence_table()
+
+    def sentence_of(self, first: int, last: int = None) -> int:
+        """token 区间 [first, last) 所在的句子编号（二分查找句子表）；不在同一句内返回 -1"""
+        last = first + 1 if last is None else last
+        k = bisect_right(self.sentence_firsts, first) - 1
+        if k < 0 or last > self.sentence_lasts[k]:
+            return -1
+        return k
+
+    def sentence(self, k: int) -> Dict:
+        """第 k 句：{'text', 'start', 'end'}（毫秒）"""
+        first, last = self.sentence_firsts[k], self.sentence_lasts[k]
+        t = self.transcript
+        return {
+            'text': ''.join(t.tokens[first:last]).strip(),
+            'start': t.starts[first],
+            'end': t.ends[last - 1]
+        }
+
+    def sentences(self) -> List[Dict]:
+        """全部句子"""
+        return [self.sentence(k) for k in range(len(self.sentence_firsts))]
+
+    def __len__(self) -> int:
+        return len(self.sentence_firsts)
+
+
+def convert(src: str, dst: str) -> str:
+    """
+    格式互转：dst 以 .json 结尾时写 JSON，否则写二进制
+
+    Returns:
+        dst 路径
+    """
+    t = Transcript.load(src)
+    if dst.endswith('.json'):
+        t.to_json(dst)
+    else:
+        t.save(dst)
+    t.close()
+    return dst
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="转录格式转换 - JSON 与列式二进制 (.vct) 互转"
+    )
+    parser.add_argument("src", help="输入转录文件（JSON 或 .vct）")
+    parser.add_argument("dst", help="输出路径（.json 写 JSON，其余写二进制）")
+    args = parser.parse_args()
+
+    convert(args.src, args.dst)
+    print(f"✅ 已转换: {args.src} → {args.dst}")
+
+
+if __name__ == "__main__":
+    main()